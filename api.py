@@ -1,7 +1,19 @@
 import requests
 import os
+import io
+import json
+import time
+import hashlib
+import tempfile
 from dotenv import load_dotenv
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util.retry import Retry
+
+from cache import ResponseCache
+from multipart_stream import MultipartStream, source_size
+from photo_processing import UPLOAD_PHOTO_COMPRESS, compress_photo
 
 # 載入環境變數
 load_dotenv()
@@ -9,33 +21,197 @@ load_dotenv()
 # API 基礎 URL，預設為 localhost:8000
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
-# 專案相關 API
-def get_projects(owner=None):
-    """取得所有專案"""
+# 連線池設定
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "20"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+API_BACKOFF_FACTOR = float(os.getenv("API_BACKOFF_FACTOR", "0.5"))
+
+# 回應快取設定（秒 / 筆數）
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "60"))
+API_CACHE_MAXSIZE = int(os.getenv("API_CACHE_MAXSIZE", "512"))
+
+# 列表 API 每頁筆數（後端 limit 預設為 100）
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "100"))
+
+# 批次上傳照片的並行數與每張照片的重試次數
+API_UPLOAD_CONCURRENCY = int(os.getenv("API_UPLOAD_CONCURRENCY", "4"))
+API_UPLOAD_RETRIES = int(os.getenv("API_UPLOAD_RETRIES", "2"))
+
+# 分段續傳設定：是否啟用（後端需支援 /api/uploads/ 分段協定）、達到多大的檔案才分段、每段大小、
+# 每段的逾時秒數，以及記錄已完成分段的本機日誌位置
+API_CHUNKED_UPLOADS = os.getenv("API_CHUNKED_UPLOADS", "false").lower() in ("1", "true", "yes")
+API_CHUNKED_MIN_BYTES = int(os.getenv("API_CHUNKED_MIN_BYTES", str(10 * 1024 * 1024)))
+API_CHUNK_SIZE = int(os.getenv("API_CHUNK_SIZE", str(5 * 1024 * 1024)))
+API_CHUNK_TIMEOUT = float(os.getenv("API_CHUNK_TIMEOUT", "60"))
+API_UPLOAD_JOURNAL_DIR = os.getenv("API_UPLOAD_JOURNAL_DIR", os.path.join(tempfile.gettempdir(), "frontend_eng", "upload_journal"))
+
+# 後端生成報告 PDF 的逾時秒數
+API_GENERATE_PDF_TIMEOUT = float(os.getenv("API_GENERATE_PDF_TIMEOUT", "300"))
+
+@st.cache_resource
+def get_session():
+    """取得全域共用的 HTTP Session（keep-alive 連線池，GET 失敗自動重試）"""
+    session = requests.Session()
+
+    # 只對冪等的 GET 請求重試，避免重複建立資料
+    retry = Retry(
+        total=API_MAX_RETRIES,
+        backoff_factor=API_BACKOFF_FACTOR,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_cache():
+    """取得全域共用的 API 回應快取"""
+    return ResponseCache(ttl=API_CACHE_TTL, maxsize=API_CACHE_MAXSIZE)
+
+def _invalidate_project(project_id):
+    """清除單一專案及其巡檢列表的快取"""
+    cache = get_cache()
+    cache.invalidate("project", project_id)
+    cache.invalidate("inspections", project_id)
+    cache.invalidate("inspections", None)
+
+def _project_of_inspection(inspection_id):
+    """從快取中查詢巡檢所屬的專案編號，查不到時回傳 None"""
+    cache = get_cache()
+    inspection = cache.peek(("inspection", inspection_id))
+    if inspection:
+        return inspection.get("project_id")
+    for _, inspections in cache.items("inspections"):
+        for item in inspections:
+            if item.get("id") == inspection_id:
+                return item.get("project_id")
+    return None
+
+def _invalidate_inspection(inspection_id, project_id=None):
+    """清除單一巡檢及所屬專案巡檢列表的快取"""
+    cache = get_cache()
+    if project_id is None:
+        project_id = _project_of_inspection(inspection_id)
+    cache.invalidate("inspection", inspection_id)
+    if project_id is not None:
+        _invalidate_project(project_id)
+    else:
+        # 不知道所屬專案時，只能清除所有巡檢列表
+        cache.invalidate("project")
+        cache.invalidate("inspections")
+
+def _inspection_of_photo(photo_id):
+    """從快取中查詢照片所屬的巡檢編號，查不到時回傳 None"""
+    cache = get_cache()
+    photo = cache.peek(("photo", photo_id))
+    if photo:
+        return photo.get("inspection_id")
+    for _, photos in cache.items("photos"):
+        for item in photos:
+            if item.get("id") == photo_id:
+                return item.get("inspection_id")
+    return None
+
+def _invalidate_photo(photo_id, inspection_id=None):
+    """清除單一照片及所屬巡檢照片列表的快取"""
+    cache = get_cache()
+    if inspection_id is None:
+        inspection_id = _inspection_of_photo(photo_id)
+    cache.invalidate("photo", photo_id)
+    cache.invalidate("photos", None)
+    if inspection_id is not None:
+        cache.invalidate("photos", inspection_id)
+        cache.invalidate("inspection", inspection_id)
+    else:
+        cache.invalidate("photos")
+        cache.invalidate("inspection")
+
+def _iter_pages(path, cache_key, error_message, params=None, headers=None, page_size=None, prefetch=False):
+    """
+    以 skip/limit 逐頁取得列表 API 的資料
+
+    Args:
+        path: API 路徑，例如 "/api/inspections/"
+        cache_key: 快取鍵前綴，每頁以 cache_key + (skip, limit) 分別快取
+        error_message: 取得失敗時顯示的訊息
+        params: 其他查詢參數
+        headers: 請求標頭
+        page_size: 每頁筆數，預設為 API_PAGE_SIZE
+        prefetch: 是否在處理目前頁面時於背景預先取得下一頁
+
+    Yields:
+        list: 每一頁的資料
+    """
+    page_size = page_size or API_PAGE_SIZE
+
+    def fetch(skip):
+        key = cache_key + (skip, page_size)
+        cached = get_cache().get(key)
+        if cached is not None:
+            return cached, None
+
+        page_params = dict(params or {}, skip=skip, limit=page_size)
+        response = get_session().get(f"{API_BASE_URL}{path}", params=page_params, headers=headers or {})
+        if response.status_code != 200:
+            return None, response.text
+        get_cache().set(key, response.json())
+        return response.json(), None
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
     try:
-        headers = {}
-        if owner:
-            headers["owner"] = owner
-            
-        response = requests.get(f"{API_BASE_URL}/api/projects/", headers=headers)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"取得專案失敗: {response.text}")
-            return []
+        skip = 0
+        page, error = fetch(skip)
+        while True:
+            if error is not None:
+                st.error(f"{error_message}: {error}")
+                return
+            if not page:
+                return
+
+            # 還有下一頁時先在背景請求
+            has_next = len(page) >= page_size
+            next_page = executor.submit(fetch, skip + page_size) if executor and has_next else None
+
+            yield page
+
+            if not has_next:
+                return
+            skip += page_size
+            page, error = next_page.result() if next_page else fetch(skip)
     except Exception as e:
         st.error(f"API 連線錯誤: {str(e)}")
-        return []
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# 專案相關 API
+def iter_projects(owner=None, page_size=None, prefetch=False):
+    """逐頁取得專案列表"""
+    headers = {"owner": owner} if owner else {}
+    return _iter_pages("/api/projects/", ("projects", owner), "取得專案失敗",
+                       headers=headers, page_size=page_size, prefetch=prefetch)
+
+def get_projects(owner=None):
+    """取得所有專案"""
+    return [project for page in iter_projects(owner) for project in page]
 
 def get_project(project_id, owner=None):
     """取得單一專案詳細資料（含巡檢）"""
     try:
+        cached = get_cache().get(("project", project_id, owner))
+        if cached is not None:
+            return cached
+
         headers = {}
         if owner:
             headers["owner"] = owner
             
-        response = requests.get(f"{API_BASE_URL}/api/projects/{project_id}", headers=headers)
+        response = get_session().get(f"{API_BASE_URL}/api/projects/{project_id}", headers=headers)
         if response.status_code == 200:
+            get_cache().set(("project", project_id, owner), response.json())
             return response.json()
         else:
             st.error(f"取得專案詳細資料失敗: {response.text}")
@@ -58,8 +234,9 @@ def create_project(data):
         owner = data.get("owner")
         headers = {"owner": owner} if owner else {}
         
-        response = requests.post(f"{API_BASE_URL}/api/projects/", json=data, headers=headers)
+        response = get_session().post(f"{API_BASE_URL}/api/projects/", json=data, headers=headers)
         if response.status_code == 201:
+            get_cache().invalidate("projects", owner)
             return response.json()
         else:
             return {"error": response.text}
@@ -80,8 +257,10 @@ def update_project(project_id, data):
         owner = data.get("owner")
         headers = {"owner": owner} if owner else {}
         
-        response = requests.put(f"{API_BASE_URL}/api/projects/{project_id}", json=data, headers=headers)
+        response = get_session().put(f"{API_BASE_URL}/api/projects/{project_id}", json=data, headers=headers)
         if response.status_code == 200:
+            get_cache().invalidate("projects", owner)
+            get_cache().invalidate("project", project_id)
             return response.json()
         else:
             return {"error": response.text}
@@ -92,8 +271,16 @@ def delete_project(project_id, owner=None):
     """刪除專案"""
     try:
         headers = {"owner": owner} if owner else {}
-        response = requests.delete(f"{API_BASE_URL}/api/projects/{project_id}", headers=headers)
+        response = get_session().delete(f"{API_BASE_URL}/api/projects/{project_id}", headers=headers)
         if response.status_code == 200:
+            # 刪除專案會連帶刪除其巡檢與照片
+            cache = get_cache()
+            for _, inspections in cache.items("inspections", project_id):
+                for inspection in inspections:
+                    cache.invalidate("inspection", inspection.get("id"))
+                    cache.invalidate("photos", inspection.get("id"))
+            cache.invalidate("projects", owner)
+            _invalidate_project(project_id)
             return response.json()
         else:
             return {"error": response.text}
@@ -101,29 +288,26 @@ def delete_project(project_id, owner=None):
         return {"error": str(e)}
 
 # 巡檢相關 API
+def iter_inspections(project_id=None, page_size=None, prefetch=False):
+    """逐頁取得巡檢列表，可選依專案篩選"""
+    params = {"project_id": project_id} if project_id else {}
+    return _iter_pages("/api/inspections/", ("inspections", project_id), "取得巡檢失敗",
+                       params=params, page_size=page_size, prefetch=prefetch)
+
 def get_inspections(project_id=None):
     """取得所有巡檢，可選依專案篩選"""
-    try:
-        url = f"{API_BASE_URL}/api/inspections/"
-        params = {}
-        if project_id:
-            params["project_id"] = project_id
-        
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"取得巡檢失敗: {response.text}")
-            return []
-    except Exception as e:
-        st.error(f"API 連線錯誤: {str(e)}")
-        return []
+    return [inspection for page in iter_inspections(project_id) for inspection in page]
 
 def get_inspection(inspection_id):
     """取得單一巡檢詳細資料（含照片）"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/inspections/{inspection_id}")
+        cached = get_cache().get(("inspection", inspection_id))
+        if cached is not None:
+            return cached
+
+        response = get_session().get(f"{API_BASE_URL}/api/inspections/{inspection_id}")
         if response.status_code == 200:
+            get_cache().set(("inspection", inspection_id), response.json())
             return response.json()
         else:
             st.error(f"取得巡檢詳細資料失敗: {response.text}")
@@ -132,6 +316,26 @@ def get_inspection(inspection_id):
         st.error(f"API 連線錯誤: {str(e)}")
         return None
 
+def get_inspections_with_photos(inspection_ids):
+    """
+    批次取得多筆巡檢詳細資料（含照片）
+
+    後端沒有批次查詢端點，因此先去除重複編號，再以有限並行數同時呼叫
+    /api/inspections/{id}；已在快取中的巡檢不會重新請求。
+
+    Args:
+        inspection_ids: 巡檢編號列表
+
+    Returns:
+        list: 與 inspection_ids 順序相同的巡檢資料，取得失敗者為 None
+    """
+    import api_async
+
+    unique_ids = list(dict.fromkeys(int(inspection_id) for inspection_id in inspection_ids))
+    results = api_async.gather([api_async.get_inspection(inspection_id) for inspection_id in unique_ids])
+    by_id = dict(zip(unique_ids, results))
+    return [by_id[int(inspection_id)] for inspection_id in inspection_ids]
+
 def create_inspection(data):
     """建立新巡檢"""
     try:
@@ -141,8 +345,9 @@ def create_inspection(data):
             if field not in data:
                 return {"error": f"缺少必要欄位: {field}"}
         
-        response = requests.post(f"{API_BASE_URL}/api/inspections/", json=data)
+        response = get_session().post(f"{API_BASE_URL}/api/inspections/", json=data)
         if response.status_code == 201:
+            _invalidate_project(data["project_id"])
             return response.json()
         else:
             return {"error": response.text}
@@ -156,8 +361,9 @@ def update_inspection(inspection_id, data):
         if "result" not in data:
             return {"error": "缺少必要欄位: result"}
         
-        response = requests.put(f"{API_BASE_URL}/api/inspections/{inspection_id}", json=data)
+        response = get_session().put(f"{API_BASE_URL}/api/inspections/{inspection_id}", json=data)
         if response.status_code == 200:
+            _invalidate_inspection(inspection_id, response.json().get("project_id"))
             return response.json()
         else:
             return {"error": response.text}
@@ -167,50 +373,270 @@ def update_inspection(inspection_id, data):
 def delete_inspection(inspection_id):
     """刪除巡檢"""
     try:
-        response = requests.delete(f"{API_BASE_URL}/api/inspections/{inspection_id}")
+        response = get_session().delete(f"{API_BASE_URL}/api/inspections/{inspection_id}")
         if response.status_code == 200:
+            # 刪除巡檢會連帶刪除其照片
+            _invalidate_inspection(inspection_id, response.json().get("project_id"))
+            get_cache().invalidate("photos", inspection_id)
+            get_cache().invalidate("photos", None)
             return response.json()
         else:
             return {"error": response.text}
     except Exception as e:
         return {"error": str(e)}
 
-def upload_inspection_pdf(inspection_id, file):
-    """上傳巡檢 PDF"""
+def _is_retryable(result):
+    """連線錯誤（沒有狀態碼）或伺服器錯誤（5xx）可重試，4xx 錯誤（例如檔案格式不符）重試也不會成功"""
+    return "error" in result and result.get("status_code", 500) >= 500
+
+def _with_retries(call, retries=API_UPLOAD_RETRIES):
+    """
+    呼叫 call() 直到成功或錯誤不可重試，最多重試 retries 次，每次間隔以 API_BACKOFF_FACTOR 指數增加
+
+    call 返回 dict，失敗時包含 "error" 與可選的 "status_code"
+    """
+    for attempt in range(retries + 1):
+        result = call()
+        if not _is_retryable(result) or attempt == retries:
+            return result
+        time.sleep(API_BACKOFF_FACTOR * (2 ** attempt))
+
+def _upload_source(file):
+    """
+    取得上傳檔案的 (檔名, 內容來源, MIME 類型)，內容不讀入記憶體
+
+    file 可為檔案路徑、StagedFile（暫存於磁碟）或 UploadedFile 等檔案物件
+    """
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.basename(file), file, None
+    if hasattr(file, "path"):
+        return file.name, file.path, file.type
+    file.seek(0)
+    return file.name, file, getattr(file, "type", None)
+
+def _post_multipart(url, fields=None, files=None):
+    """以串流方式送出 multipart/form-data 請求"""
+    body = MultipartStream(fields, files)
+    return get_session().post(url, data=body, headers={"Content-Type": body.content_type})
+
+# 分段續傳
+#
+# 協定（後端或 chunk_upload_server.py）：
+#   POST /api/uploads/                     {"filename", "size", "chunk_size", "sha256"} -> {"upload_id", "received": [...]}
+#   GET  /api/uploads/{upload_id}          -> {"upload_id", "size", "chunk_size", "received": [...]}
+#   PUT  /api/uploads/{upload_id}/chunks/{index}  分段內容（標頭 X-Chunk-Sha256）
+#   POST /api/uploads/{upload_id}/complete {"target": {...}} -> 與一般上傳 API 相同的回應
+# target 為 {"type": "inspection_pdf", "inspection_id"} 或
+# {"type": "photo", "inspection_id", "capture_date", "caption", "content_type"}
+
+def _use_chunked(source, chunked):
+    """chunked 為 None 時，依 API_CHUNKED_UPLOADS 與檔案大小決定是否分段上傳"""
+    if chunked is None:
+        return API_CHUNKED_UPLOADS and source_size(source) >= API_CHUNKED_MIN_BYTES
+    return chunked
+
+def _open_source(source):
+    """以檔案物件開啟上傳來源，返回 (檔案物件, 是否需由呼叫端關閉)"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source), True
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb"), True
+    source.seek(0)
+    return source, False
+
+def _journal_path(key):
+    return os.path.join(API_UPLOAD_JOURNAL_DIR, f"{key}.json")
+
+def _load_journal(key):
+    try:
+        with open(_journal_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_journal(key, journal):
+    """原子寫入分段日誌，中斷時不會留下不完整的內容"""
+    os.makedirs(API_UPLOAD_JOURNAL_DIR, exist_ok=True)
+    tmp_path = f"{_journal_path(key)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(journal, f)
+    os.replace(tmp_path, _journal_path(key))
+
+def _remove_journal(key):
+    try:
+        os.remove(_journal_path(key))
+    except OSError:
+        pass
+
+def _put_chunk(upload_id, index, chunk, retries=API_UPLOAD_RETRIES):
+    """上傳單一分段，連線錯誤或伺服器錯誤（5xx）時重試，成功返回 {}，否則返回 {"error": ...}"""
+    headers = {"Content-Type": "application/octet-stream", "X-Chunk-Sha256": hashlib.sha256(chunk).hexdigest()}
+
+    def put():
+        try:
+            response = get_session().put(f"{API_BASE_URL}/api/uploads/{upload_id}/chunks/{index}",
+                                         data=chunk, headers=headers, timeout=API_CHUNK_TIMEOUT)
+            if response.status_code in (200, 201, 204):
+                return {}
+            return {"error": response.text, "status_code": response.status_code}
+        except Exception as e:
+            return {"error": str(e)}
+
+    return _with_retries(put, retries)
+
+def chunked_upload(filename, source, target, chunk_size=API_CHUNK_SIZE, progress=None):
+    """
+    分段上傳檔案，已完成的分段記錄於本機日誌，中斷後再次呼叫會從未完成的分段繼續
+
+    Args:
+        filename: 檔名
+        source: 檔案內容（bytes）、檔案路徑或可 seek 的檔案物件
+        target: 上傳完成後的處理方式（見上方協定說明）
+        chunk_size: 每段大小（續傳時沿用日誌中的大小）
+        progress: 可選的進度回呼 progress(已上傳位元組, 總位元組)
+
+    Returns:
+        dict: 完成時為後端回應；失敗時為 {"error": ..., "resumable": True}，已上傳的分段保留供下次續傳
+    """
+    file, close = _open_source(source)
+    try:
+        # 以內容雜湊與目標識別同一筆上傳（同一檔案重新選擇後仍可續傳）
+        digest = hashlib.sha256()
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+        size = file.tell()
+        sha256 = digest.hexdigest()
+        key = hashlib.sha256(json.dumps([sha256, target], sort_keys=True).encode("utf-8")).hexdigest()
+
+        # 日誌中的上傳仍存在於後端時，以後端記錄的已接收分段為準
+        journal = _load_journal(key)
+        received = set()
+        if journal:
+            response = get_session().get(f"{API_BASE_URL}/api/uploads/{journal['upload_id']}")
+            if response.status_code == 200:
+                received = set(response.json().get("received", []))
+            else:
+                journal = None
+        if journal is None:
+            response = get_session().post(f"{API_BASE_URL}/api/uploads/", json={
+                "filename": filename, "size": size, "chunk_size": chunk_size, "sha256": sha256,
+            })
+            if response.status_code not in (200, 201):
+                return {"error": response.text}
+            journal = {"upload_id": response.json()["upload_id"], "filename": filename, "size": size,
+                       "chunk_size": chunk_size, "sha256": sha256, "completed": []}
+            received = set(response.json().get("received", []))
+        journal["completed"] = sorted(received)
+        _save_journal(key, journal)
+
+        # 依序上傳尚未完成的分段，每段完成後更新日誌
+        chunk_size = journal["chunk_size"]
+        chunk_count = max(1, -(-size // chunk_size))
+        for index in range(chunk_count):
+            if index in received:
+                continue
+            file.seek(index * chunk_size)
+            result = _put_chunk(journal["upload_id"], index, file.read(chunk_size))
+            if "error" in result:
+                return {"error": f"分段 {index + 1}/{chunk_count} 上傳失敗: {result['error']}", "resumable": True}
+            received.add(index)
+            journal["completed"] = sorted(received)
+            _save_journal(key, journal)
+            if progress:
+                progress(min(size, len(received) * chunk_size), size)
+
+        response = get_session().post(f"{API_BASE_URL}/api/uploads/{journal['upload_id']}/complete", json={"target": target})
+        if response.status_code not in (200, 201):
+            # 內容檢查失敗等 4xx 錯誤無法續傳，下次重新上傳
+            if response.status_code < 500:
+                _remove_journal(key)
+            return {"error": response.text, "resumable": response.status_code >= 500}
+        _remove_journal(key)
+        return response.json()
+    except Exception as e:
+        return {"error": str(e), "resumable": True}
+    finally:
+        if close:
+            file.close()
+
+def upload_inspection_pdf(inspection_id, file, chunked=None):
+    """
+    上傳巡檢 PDF（以串流方式傳送，不將檔案讀入記憶體）
+
+    chunked 為 True 時使用分段續傳；None 時依 API_CHUNKED_UPLOADS 與檔案大小自動決定
+    """
     try:
-        files = {"file": (file.name,file.getvalue(), "application/pdf")}
-        response = requests.post(f"{API_BASE_URL}/api/inspections/{inspection_id}/upload-pdf", files=files)
+        filename, source, _ = _upload_source(file)
+        if _use_chunked(source, chunked):
+            result = chunked_upload(filename, source, {"type": "inspection_pdf", "inspection_id": inspection_id})
+            if "error" not in result:
+                _invalidate_inspection(inspection_id, result.get("project_id"))
+            return result
+        files = {"file": (filename, source, "application/pdf")}
+        response = _post_multipart(f"{API_BASE_URL}/api/inspections/{inspection_id}/upload-pdf", files=files)
         if response.status_code == 200:
+            _invalidate_inspection(inspection_id, response.json().get("project_id"))
             return response.json()
         else:
             return {"error": response.text}
     except Exception as e:
         return {"error": str(e)}
 
-# 照片相關 API
-def get_photos(inspection_id=None):
-    """取得所有照片，可選依巡檢篩選"""
+def generate_inspection_pdf(inspection_id, timeout=API_GENERATE_PDF_TIMEOUT):
+    """
+    由後端生成巡檢報告 PDF（含巡檢資料與照片），返回含 pdf_path 的巡檢資料
+
+    注意：此為會改寫資料的 POST，返回的巡檢 pdf_path 指向生成的報告，可能取代使用者上傳的原始抽查表
+    """
     try:
-        url = f"{API_BASE_URL}/api/photos/"
-        params = {}
-        if inspection_id:
-            params["inspection_id"] = inspection_id
-        
-        response = requests.get(url, params=params)
+        response = get_session().post(f"{API_BASE_URL}/api/inspections/{inspection_id}/generate-pdf", timeout=timeout)
         if response.status_code == 200:
+            _invalidate_inspection(inspection_id, response.json().get("project_id"))
             return response.json()
         else:
-            st.error(f"取得照片失敗: {response.text}")
-            return []
+            return {"error": response.text}
     except Exception as e:
-        st.error(f"API 連線錯誤: {str(e)}")
-        return []
+        return {"error": str(e)}
+
+# 照片相關 API
+def iter_photos(inspection_id=None, page_size=None, prefetch=False):
+    """逐頁取得照片列表，可選依巡檢篩選"""
+    params = {"inspection_id": inspection_id} if inspection_id else {}
+    return _iter_pages("/api/photos/", ("photos", inspection_id), "取得照片失敗",
+                       params=params, page_size=page_size, prefetch=prefetch)
+
+def get_photos(inspection_id=None):
+    """取得所有照片，可選依巡檢篩選"""
+    return [photo for page in iter_photos(inspection_id) for photo in page]
+
+def get_photos_by_inspections(inspection_ids):
+    """
+    取得多筆巡檢的照片（例如單一專案的所有巡檢）
+
+    以有限並行數對每個巡檢呼叫 /api/photos/?inspection_id=，避免下載整個系統的照片清單。
+
+    Args:
+        inspection_ids: 巡檢編號列表
+
+    Returns:
+        list: 所有巡檢照片合併後的列表，依 inspection_ids 順序排列
+    """
+    import api_async
+
+    unique_ids = list(dict.fromkeys(int(inspection_id) for inspection_id in inspection_ids))
+    results = api_async.gather([api_async.get_photos(inspection_id) for inspection_id in unique_ids])
+    return [photo for photos in results for photo in photos]
 
 def get_photo(photo_id):
     """取得單一照片詳細資料"""
     try:
-        response = requests.get(f"{API_BASE_URL}/api/photos/{photo_id}")
+        cached = get_cache().get(("photo", photo_id))
+        if cached is not None:
+            return cached
+
+        response = get_session().get(f"{API_BASE_URL}/api/photos/{photo_id}")
         if response.status_code == 200:
+            get_cache().set(("photo", photo_id), response.json())
             return response.json()
         else:
             st.error(f"取得照片詳細資料失敗: {response.text}")
@@ -219,24 +645,77 @@ def get_photo(photo_id):
         st.error(f"API 連線錯誤: {str(e)}")
         return None
 
-def upload_photo(inspection_id, file, capture_date, caption):
-    """上傳照片"""
+def upload_photo(inspection_id, file, capture_date, caption, compress=UPLOAD_PHOTO_COMPRESS, chunked=None, retries=0):
+    """
+    上傳照片（以串流方式傳送），compress 為 True 時先轉正、縮小並重新壓縮（見 photo_processing.compress_photo）
+
+    chunked 為 True 時使用分段續傳（各分段依 API_UPLOAD_RETRIES 重試）；None 時依 API_CHUNKED_UPLOADS 與（壓縮後的）檔案大小自動決定。
+    一般上傳在連線錯誤或伺服器錯誤（5xx）時最多重試 retries 次。
+    """
     try:
-        files = {"file": (file.name, file, "image/jpeg")}
+        filename, source, mimetype = _upload_source(file)
+        if compress:
+            try:
+                source, mimetype, filename = compress_photo(source, filename)
+            except Exception:
+                # 無法處理的檔案直接上傳原始內容
+                filename, source, mimetype = _upload_source(file)
+        if _use_chunked(source, chunked):
+            result = chunked_upload(filename, source, {
+                "type": "photo", "inspection_id": inspection_id, "capture_date": capture_date,
+                "caption": caption, "content_type": mimetype or "image/jpeg",
+            })
+            if "error" not in result:
+                _invalidate_photo(result.get("id"), inspection_id)
+            return result
+        files = {"file": (filename, source, mimetype or "image/jpeg")}
         data = {"inspection_id": inspection_id, "capture_date": capture_date, "caption": caption}
-        response = requests.post(f"{API_BASE_URL}/api/photos/", files=files, data=data)
-        if response.status_code == 201:
-            return response.json()
-        else:
-            return {"error": response.text}
+
+        def post():
+            try:
+                if hasattr(source, "seek"):
+                    source.seek(0)
+                response = _post_multipart(f"{API_BASE_URL}/api/photos/", fields=data, files=files)
+                if response.status_code == 201:
+                    _invalidate_photo(response.json().get("id"), inspection_id)
+                    return response.json()
+                return {"error": response.text, "status_code": response.status_code}
+            except Exception as e:
+                return {"error": str(e)}
+
+        return _with_retries(post, retries)
     except Exception as e:
         return {"error": str(e)}
 
+def upload_photos(inspection_id, photos, capture_date, max_workers=API_UPLOAD_CONCURRENCY, retries=API_UPLOAD_RETRIES, progress=None):
+    """
+    以有限並行數批次上傳照片（api_async.gather），連線錯誤或伺服器錯誤（5xx）時個別重試
+
+    Args:
+        inspection_id: 巡檢 ID
+        photos: 照片列表，每個元素為 {"file": 檔案, "caption": 說明}
+        capture_date: 照片日期
+        max_workers: 同時上傳的照片數上限
+        retries: 每張照片的重試次數
+        progress: 可選的進度回呼 progress(已完成數, 總數)，在呼叫端執行緒中呼叫
+
+    Returns:
+        list: 與 photos 順序相同的上傳結果，失敗者為 {"error": ...}
+    """
+    import api_async
+
+    return api_async.gather(
+        [api_async.upload_photo(inspection_id, photo["file"], capture_date, photo["caption"], retries=retries) for photo in photos],
+        max_concurrency=max_workers,
+        progress=progress
+    )
+
 def update_photo(photo_id, data):
     """更新照片資料"""
     try:
-        response = requests.put(f"{API_BASE_URL}/api/photos/{photo_id}", json=data)
+        response = get_session().put(f"{API_BASE_URL}/api/photos/{photo_id}", json=data)
         if response.status_code == 200:
+            _invalidate_photo(photo_id, response.json().get("inspection_id"))
             return response.json()
         else:
             return {"error": response.text}
@@ -246,8 +725,9 @@ def update_photo(photo_id, data):
 def delete_photo(photo_id):
     """刪除照片"""
     try:
-        response = requests.delete(f"{API_BASE_URL}/api/photos/{photo_id}")
+        response = get_session().delete(f"{API_BASE_URL}/api/photos/{photo_id}")
         if response.status_code == 200:
+            _invalidate_photo(photo_id, response.json().get("inspection_id"))
             return response.json()
         else:
             return {"error": response.text}
@@ -262,7 +742,7 @@ def get_project_storage(project_id, owner=None):
         if owner:
             headers["owner"] = owner
         
-        response = requests.get(f"{API_BASE_URL}/api/projects/{project_id}/storage", headers=headers)
+        response = get_session().get(f"{API_BASE_URL}/api/projects/{project_id}/storage", headers=headers)
         if response.status_code == 200:
             return response.json()
         else:
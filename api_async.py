@@ -0,0 +1,89 @@
+import asyncio
+import os
+import threading
+from functools import wraps
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import api
+
+# 同時進行的 API 請求上限，預設為 8
+API_CONCURRENCY = int(os.getenv("API_CONCURRENCY", "8"))
+
+def _to_async(func):
+    """將 api.py 的同步函式包裝為 coroutine（在執行緒中執行，共用同一個連線池）"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        # 讓背景執行緒也能使用 st.error 等 Streamlit 指令
+        ctx = get_script_run_ctx()
+
+        def call():
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+            return func(*args, **kwargs)
+
+        return await asyncio.to_thread(call)
+    return wrapper
+
+# 專案相關 API
+get_projects = _to_async(api.get_projects)
+get_project = _to_async(api.get_project)
+create_project = _to_async(api.create_project)
+update_project = _to_async(api.update_project)
+delete_project = _to_async(api.delete_project)
+
+# 巡檢相關 API
+get_inspections = _to_async(api.get_inspections)
+get_inspection = _to_async(api.get_inspection)
+get_inspections_with_photos = _to_async(api.get_inspections_with_photos)
+create_inspection = _to_async(api.create_inspection)
+update_inspection = _to_async(api.update_inspection)
+delete_inspection = _to_async(api.delete_inspection)
+upload_inspection_pdf = _to_async(api.upload_inspection_pdf)
+chunked_upload = _to_async(api.chunked_upload)
+generate_inspection_pdf = _to_async(api.generate_inspection_pdf)
+
+# 照片相關 API
+get_photos = _to_async(api.get_photos)
+get_photos_by_inspections = _to_async(api.get_photos_by_inspections)
+get_photo = _to_async(api.get_photo)
+upload_photo = _to_async(api.upload_photo)
+upload_photos = _to_async(api.upload_photos)
+update_photo = _to_async(api.update_photo)
+delete_photo = _to_async(api.delete_photo)
+
+# 儲存空間相關 API
+get_project_storage = _to_async(api.get_project_storage)
+
+async def _bounded_gather(coros, max_concurrency, progress=None):
+    """以 Semaphore 限制並行數量執行多個 coroutine，每完成一個呼叫 progress(已完成數, 總數)"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    done = 0
+
+    async def run(coro):
+        nonlocal done
+        async with semaphore:
+            result = await coro
+        done += 1
+        if progress:
+            progress(done, len(coros))
+        return result
+
+    return await asyncio.gather(*(run(coro) for coro in coros))
+
+def gather(coros, max_concurrency=API_CONCURRENCY, progress=None):
+    """
+    同步執行多個 API coroutine 並依原順序回傳結果，供 Streamlit 腳本直接呼叫
+
+    Args:
+        coros: coroutine 列表，例如 [get_inspection(1), get_inspection(2)]
+        max_concurrency: 同時進行的請求上限
+        progress: 可選的進度回呼 progress(已完成數, 總數)，在呼叫端執行緒中呼叫
+
+    Returns:
+        list: 與 coros 順序相同的結果列表
+    """
+    coros = list(coros)
+    if not coros:
+        return []
+    return asyncio.run(_bounded_gather(coros, max(1, max_concurrency), progress))
@@ -0,0 +1,178 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    API 回應快取，以實體為鍵（例如 ("inspections", project_id)），支援 TTL 與 LRU 淘汰
+
+    鍵一律為 tuple，第一個元素為實體類型，invalidate 時可用前綴一次清除同類鍵
+    """
+
+    def __init__(self, ttl=60, maxsize=512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """取得快取資料，過期或不存在時回傳 None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            # 回傳複本，避免呼叫端修改到快取內容
+            return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """寫入快取資料，超過容量時淘汰最久未使用的項目"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def peek(self, key):
+        """取得快取資料但不更新 LRU 順序（供失效判斷使用）"""
+        with self._lock:
+            item = self._data.get(key)
+            return item[1] if item else None
+
+    def items(self, *prefix):
+        """列出符合前綴的所有快取項目"""
+        with self._lock:
+            return [(k, v) for k, (_, v) in self._data.items() if k[:len(prefix)] == prefix]
+
+    def invalidate(self, *prefix):
+        """清除所有鍵以 prefix 開頭的快取項目"""
+        with self._lock:
+            for key in [k for k in self._data if k[:len(prefix)] == prefix]:
+                del self._data[key]
+
+    def clear(self):
+        """清除全部快取"""
+        with self._lock:
+            self._data.clear()
+
+class DiskCache:
+    """
+    以檔案儲存的快取，依總位元組數進行 LRU 淘汰
+
+    鍵直接作為檔名使用，呼叫端應傳入雜湊值等安全字串
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+
+        # 載入既有檔案，依最後使用時間排序
+        files = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.endswith(".tmp")]
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime):
+            self._entries[entry.name] = entry.stat().st_size
+            self._total_bytes += entry.stat().st_size
+        with self._lock:
+            self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def path(self, key):
+        """取得快取檔案路徑並更新使用順序，不存在時回傳 None"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            # 以修改時間記錄使用順序，重新啟動後仍可維持 LRU
+            os.utime(path)
+        except OSError:
+            self._discard(key)
+            return None
+        return path
+
+    def open(self, key):
+        """
+        開啟快取檔案並更新使用順序，不存在時回傳 None
+
+        已開啟的檔案在之後被淘汰刪除時仍可讀取（POSIX），可用於保留之後才讀取的快取項目
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            try:
+                # 在鎖內開啟，避免開啟前被其他執行緒淘汰
+                f = open(self._path(key), "rb")
+            except OSError:
+                self._total_bytes -= self._entries.pop(key, 0)
+                return None
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return f
+
+    def get(self, key):
+        """讀取快取內容，不存在時回傳 None"""
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            self._discard(key)
+            return None
+
+    def set(self, key, data):
+        """寫入快取內容，超過容量時淘汰最久未使用的檔案"""
+        self.set_file(key, lambda f: f.write(data))
+
+    def set_file(self, key, write, keep_open=False):
+        """
+        以 write(file) 寫入快取檔案（可分段寫入），完成後才加入快取
+
+        Returns:
+            keep_open 為 True 時返回已開啟的快取檔案（見 open），否則返回檔案路徑
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._total_bytes += size
+            f = open(path, "rb") if keep_open else None
+            self._evict()
+        return f if keep_open else path
+
+    def _discard(self, key):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        # 保留最新寫入的一筆，避免單一檔案超過上限時無法使用
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
@@ -0,0 +1,196 @@
+"""
+分段續傳協定的本機替代後端，用於在後端支援 /api/uploads/ 之前測試 api.chunked_upload
+
+用法:
+    python chunk_upload_server.py --port 8001 --fail-rate 0.2
+    API_BASE_URL=http://localhost:8001 API_CHUNKED_UPLOADS=true streamlit run streamlit_app.py
+
+--fail-rate 會讓部分分段隨機回應 503，用來測試重試與續傳；
+指定 --forward 時，完成的檔案會以一般上傳 API 轉送到實際後端，否則只存於 --dir 並返回模擬的回應。
+其他 API 請求一律轉送到 --forward（未指定時回應 404）。
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from multipart_stream import MultipartStream
+
+class UploadStore:
+    """以目錄保存各上傳的分段與狀態"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _dir(self, upload_id):
+        return os.path.join(self.directory, upload_id)
+
+    def create(self, info):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._dir(upload_id))
+        with open(os.path.join(self._dir(upload_id), "info.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        return upload_id
+
+    def info(self, upload_id):
+        """返回上傳資訊與已接收的分段，不存在時返回 None"""
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id) or not os.path.isdir(self._dir(upload_id)):
+            return None
+        with open(os.path.join(self._dir(upload_id), "info.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        received = sorted(int(name[:-6]) for name in os.listdir(self._dir(upload_id)) if name.endswith(".chunk"))
+        return {**info, "upload_id": upload_id, "received": received}
+
+    def put_chunk(self, upload_id, index, data):
+        tmp_path = os.path.join(self._dir(upload_id), f"{index}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self._dir(upload_id), f"{index}.chunk"))
+
+    def assemble(self, upload_id):
+        """依序組合所有分段並檢查大小與雜湊，返回 (檔案路徑, 錯誤訊息)"""
+        info = self.info(upload_id)
+        chunk_count = max(1, -(-info["size"] // info["chunk_size"]))
+        missing = [index for index in range(chunk_count) if index not in info["received"]]
+        if missing:
+            return None, f"缺少分段: {missing}"
+
+        path = os.path.join(self._dir(upload_id), "file")
+        digest = hashlib.sha256()
+        with open(path, "wb") as output:
+            for index in range(chunk_count):
+                with open(os.path.join(self._dir(upload_id), f"{index}.chunk"), "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(block)
+                        output.write(block)
+        if os.path.getsize(path) != info["size"] or digest.hexdigest() != info["sha256"]:
+            return None, "檔案大小或雜湊值不符"
+        return path, None
+
+    def remove(self, upload_id):
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+def make_handler(store, fail_rate=0.0, forward=None):
+    photo_ids = iter(range(1, 1 << 31))
+
+    class Handler(BaseHTTPRequestHandler):
+        def _json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _forward(self):
+            """轉送分段協定以外的請求到實際後端"""
+            if not forward:
+                return self._json(404, {"detail": "Not Found"})
+            headers = {key: value for key, value in self.headers.items() if key.lower() not in ("host", "content-length")}
+            response = requests.request(self.command, f"{forward}{self.path}", headers=headers, data=self._body() or None)
+            self.send_response(response.status_code)
+            for key, value in response.headers.items():
+                if key.lower() not in ("content-length", "transfer-encoding", "connection", "content-encoding"):
+                    self.send_header(key, value)
+            self.send_header("Content-Length", str(len(response.content)))
+            self.end_headers()
+            self.wfile.write(response.content)
+
+        def do_GET(self):
+            match = re.fullmatch(r"/api/uploads/([^/]+)", self.path)
+            if not match:
+                return self._forward()
+            info = store.info(match.group(1))
+            if info is None:
+                return self._json(404, {"detail": "Upload not found"})
+            self._json(200, info)
+
+        def do_PUT(self):
+            match = re.fullmatch(r"/api/uploads/([^/]+)/chunks/(\d+)", self.path)
+            if not match:
+                return self._forward()
+            upload_id, index = match.group(1), int(match.group(2))
+            if store.info(upload_id) is None:
+                return self._json(404, {"detail": "Upload not found"})
+            data = self._body()
+            if random.random() < fail_rate:
+                return self._json(503, {"detail": "Injected failure"})
+            if hashlib.sha256(data).hexdigest() != self.headers.get("X-Chunk-Sha256", ""):
+                return self._json(400, {"detail": "Chunk checksum mismatch"})
+            store.put_chunk(upload_id, index, data)
+            self._json(200, {"index": index})
+
+        def do_POST(self):
+            if self.path == "/api/uploads/":
+                info = json.loads(self._body())
+                upload_id = store.create({key: info[key] for key in ("filename", "size", "chunk_size", "sha256")})
+                return self._json(201, store.info(upload_id))
+
+            match = re.fullmatch(r"/api/uploads/([^/]+)/complete", self.path)
+            if not match:
+                return self._forward()
+            upload_id = match.group(1)
+            info = store.info(upload_id)
+            if info is None:
+                return self._json(404, {"detail": "Upload not found"})
+            path, error = store.assemble(upload_id)
+            if error:
+                return self._json(400, {"detail": error})
+
+            target = json.loads(self._body())["target"]
+            status, result = self._complete(target, info["filename"], path)
+            if status < 500:
+                store.remove(upload_id)
+            self._json(status, result)
+
+        def _complete(self, target, filename, path):
+            """完成上傳：轉送到實際後端的一般上傳 API，或返回模擬的回應"""
+            if target["type"] == "inspection_pdf":
+                if forward:
+                    body = MultipartStream(files={"file": (filename, path, "application/pdf")})
+                    response = requests.post(f"{forward}/api/inspections/{target['inspection_id']}/upload-pdf",
+                                             data=body, headers={"Content-Type": body.content_type})
+                    return response.status_code, response.json()
+                return 200, {"id": target["inspection_id"], "project_id": None, "pdf_path": f"uploads/{filename}"}
+
+            if target["type"] == "photo":
+                fields = {key: target[key] for key in ("inspection_id", "capture_date", "caption")}
+                if forward:
+                    body = MultipartStream(fields, {"file": (filename, path, target.get("content_type"))})
+                    response = requests.post(f"{forward}/api/photos/", data=body, headers={"Content-Type": body.content_type})
+                    return response.status_code, response.json()
+                return 201, {"id": next(photo_ids), **fields, "photo_path": f"uploads/{filename}"}
+
+            return 400, {"detail": f"Unknown target type: {target['type']}"}
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="分段續傳協定的本機替代後端")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "frontend_eng", "chunk_uploads"))
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="分段請求隨機回應 503 的比例")
+    parser.add_argument("--forward", default=None, help="實際後端的 URL，例如 http://localhost:8000")
+    args = parser.parse_args()
+
+    handler = make_handler(UploadStore(args.dir), args.fail_rate, args.forward.rstrip("/") if args.forward else None)
+    print(f"分段上傳替代後端: http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), handler).serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
 import pandas as pd
-from api import get_projects, get_inspections, get_photos
+from api import iter_projects, iter_inspections, iter_photos, get_photos_by_inspections
+
+def _pages_to_df(pages):
+    """將逐頁取得的資料逐頁轉換為 DataFrame 後合併"""
+    frames = [pd.DataFrame(page) for page in pages]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
 
 def get_projects_df(owner):
     """將專案資料轉換為 DataFrame 格式"""
-    projects = get_projects(owner)
-    if not projects:
+    # 逐頁取得並轉換為 DataFrame，再重新命名欄位為中文
+    df = _pages_to_df(iter_projects(owner, prefetch=True))
+    if df.empty:
         return pd.DataFrame()
     
-    # 轉換為 DataFrame 並重新命名欄位為中文
-    df = pd.DataFrame(projects)
     if not df.empty:
         # 重新命名欄位
         df = df.rename(columns={
@@ -31,12 +37,11 @@ def get_projects_df(owner):
 
 def get_inspections_df(project_id=None):
     """將巡檢資料轉換為 DataFrame 格式"""
-    inspections = get_inspections(project_id)
-    if not inspections:
+    # 逐頁取得並轉換為 DataFrame，再重新命名欄位為中文
+    df = _pages_to_df(iter_inspections(project_id, prefetch=True))
+    if df.empty:
         return pd.DataFrame()
     
-    # 轉換為 DataFrame 並重新命名欄位為中文
-    df = pd.DataFrame(inspections)
     if not df.empty:
         # 重新命名欄位
         df = df.rename(columns={
@@ -70,12 +75,29 @@ def get_inspections_df(project_id=None):
 
 def get_photos_df(inspection_id=None):
     """將照片資料轉換為 DataFrame 格式"""
-    photos = get_photos(inspection_id)
-    if not photos:
+    return _photos_to_df(_pages_to_df(iter_photos(inspection_id, prefetch=True)))
+
+def get_project_photos_df(project_id):
+    """取得單一專案的照片資料，並附加抽查資訊（檢查位置、抽查表名稱、抽查次數）"""
+    inspections_df = get_inspections_df(project_id)
+    if inspections_df.empty:
+        return pd.DataFrame()
+
+    # 只查詢此專案抽查的照片
+    photos = get_photos_by_inspections(inspections_df["抽查編號"].tolist())
+    df = _photos_to_df(pd.DataFrame(photos))
+    if df.empty:
+        return df
+
+    # 以抽查編號為索引附加抽查資訊
+    inspection_info = inspections_df.set_index("抽查編號")[["檢查位置", "抽查表名稱", "抽查次數"]]
+    return df.join(inspection_info, on="抽查編號")
+
+def _photos_to_df(df):
+    """將照片 DataFrame 重新命名欄位為中文並轉換日期格式"""
+    if df.empty:
         return pd.DataFrame()
     
-    # 轉換為 DataFrame 並重新命名欄位為中文
-    df = pd.DataFrame(photos)
     if not df.empty:
         # 重新命名欄位
         df = df.rename(columns={
@@ -0,0 +1,97 @@
+import os
+import uuid
+
+# 串流上傳時每次讀取的區塊大小
+MULTIPART_CHUNK_SIZE = int(os.getenv("MULTIPART_CHUNK_SIZE", str(1024 * 1024)))
+
+def source_size(source):
+    """取得 bytes、檔案路徑或檔案物件（自目前位置起）的大小"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END) - position
+    source.seek(position)
+    return size
+
+class MultipartStream:
+    """
+    以串流方式產生 multipart/form-data 內容，檔案內容在傳送時才分段讀取
+
+    可直接作為 requests 的 data 參數（headers 需帶入 content_type），
+    長度事先計算，請求仍會帶 Content-Length，記憶體用量不隨檔案大小增加。
+
+    Args:
+        fields: 一般欄位 {名稱: 值}
+        files: 檔案欄位 {名稱: (檔名, 來源, MIME 類型)}，來源可為 bytes、檔案路徑或可 seek 的檔案物件
+    """
+
+    def __init__(self, fields=None, files=None):
+        self.boundary = uuid.uuid4().hex
+        self._parts = []
+        for name, value in (fields or {}).items():
+            self._parts.append(self._header(name) + b"\r\n" + str(value).encode("utf-8") + b"\r\n")
+        for name, (filename, source, content_type) in (files or {}).items():
+            self._parts.append(self._header(name, filename, content_type) + b"\r\n")
+            self._parts.append(source)
+            self._parts.append(b"\r\n")
+        self._parts.append(f"--{self.boundary}--\r\n".encode("utf-8"))
+
+        self.len = sum(source_size(part) for part in self._parts)
+        self._iterator = self._chunks()
+        self._chunk = b""
+        self._offset = 0
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.len
+
+    def __iter__(self):
+        # requests 以是否可迭代判斷 data 為串流
+        return iter(lambda: self.read(MULTIPART_CHUNK_SIZE), b"")
+
+    @staticmethod
+    def _quote(value):
+        # 與 urllib3 相同的 HTML5 格式：檔名以 UTF-8 傳送，只跳脫引號與換行
+        return str(value).replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+    def _header(self, name, filename=None, content_type=None):
+        disposition = f'form-data; name="{self._quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{self._quote(filename)}"'
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        return header.encode("utf-8")
+
+    def _chunks(self):
+        for part in self._parts:
+            if isinstance(part, (bytes, bytearray)):
+                yield bytes(part)
+            elif isinstance(part, (str, os.PathLike)):
+                with open(part, "rb") as f:
+                    yield from iter(lambda: f.read(MULTIPART_CHUNK_SIZE), b"")
+            else:
+                yield from iter(lambda: part.read(MULTIPART_CHUNK_SIZE), b"")
+
+    def read(self, size=-1):
+        """讀取最多 size 位元組（size < 0 時讀取全部）"""
+        data = []
+        remaining = size
+        while size < 0 or remaining > 0:
+            if self._offset >= len(self._chunk):
+                self._chunk = next(self._iterator, None)
+                self._offset = 0
+                if self._chunk is None:
+                    self._chunk = b""
+                    break
+                continue
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._offset + remaining)
+            data.append(self._chunk[self._offset:end])
+            remaining -= end - self._offset
+            self._offset = end
+        return b"".join(data)
@@ -0,0 +1,146 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pypdfium2 as pdfium
+import streamlit as st
+from PIL import features
+
+from api import API_BASE_URL, get_session
+from cache import DiskCache
+
+# PDF 預覽設定：渲染倍率、預先渲染前後各幾頁、同時保留的文件數與下載逾時秒數
+PDF_PREVIEW_SCALE = float(os.getenv("PDF_PREVIEW_SCALE", "2"))
+PDF_PREVIEW_PREFETCH = int(os.getenv("PDF_PREVIEW_PREFETCH", "1"))
+PDF_PREVIEW_MAX_DOCUMENTS = int(os.getenv("PDF_PREVIEW_MAX_DOCUMENTS", "16"))
+PDF_PREVIEW_TIMEOUT = float(os.getenv("PDF_PREVIEW_TIMEOUT", "30"))
+# 預覽文件保留的秒數（暫存檔刪除後，已開啟的文件最多再保留這段時間）
+PDF_PREVIEW_TTL = float(os.getenv("PDF_PREVIEW_TTL", "600"))
+
+# 已渲染頁面的磁碟快取（所有使用者與頁面共用）
+# PNG 可直接交給 st.image 顯示；WebP（無損）檔案約小一個數量級，但顯示時需轉檔
+PDF_PAGE_CACHE_DIR = os.getenv("PDF_PAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "frontend_eng", "pdf_pages"))
+PDF_PAGE_CACHE_MAX_BYTES = int(os.getenv("PDF_PAGE_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+PDF_PAGE_FORMAT = os.getenv("PDF_PAGE_FORMAT", "PNG").upper()
+if PDF_PAGE_FORMAT != "WEBP" or not features.check("webp"):
+    PDF_PAGE_FORMAT = "PNG"
+
+# pdfium 不支援多執行緒同時呼叫，所有文件共用同一把鎖
+_pdfium_lock = threading.Lock()
+
+@st.cache_resource
+def get_page_cache():
+    """取得全域共用的 PDF 頁面磁碟快取"""
+    return DiskCache(PDF_PAGE_CACHE_DIR, PDF_PAGE_CACHE_MAX_BYTES)
+
+def page_key(content_hash, index, scale):
+    """頁面快取鍵：PDF 內容雜湊、頁碼與渲染倍率"""
+    return f"{content_hash}-{index}-{scale:g}.{PDF_PAGE_FORMAT.lower()}"
+
+def content_hash(source):
+    """計算 PDF 內容（bytes 或檔案路徑）的 SHA-256，檔案分段讀取"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def encode_page(image):
+    """將頁面圖像壓縮為 PDF_PAGE_FORMAT 格式（無損）"""
+    output = io.BytesIO()
+    if PDF_PAGE_FORMAT == "WEBP":
+        image.save(output, format="WEBP", lossless=True)
+    else:
+        image.save(output, format="PNG")
+    return output.getvalue()
+
+class PdfPreview:
+    """
+    只開啟一次的 PDF 預覽文件，頁面在需要顯示時才渲染
+
+    傳入檔案路徑時由 pdfium 直接讀取檔案，不將整個 PDF 讀入記憶體。
+
+    顯示某頁時會在背景預先渲染前後 PDF_PREVIEW_PREFETCH 頁，其他頁面的渲染結果會被釋放。
+    渲染後的頁面以 (內容雜湊, 頁碼, 倍率) 存入共用的磁碟快取，重新開啟同一份 PDF 時不需重新渲染。
+    """
+
+    def __init__(self, source, scale=PDF_PREVIEW_SCALE):
+        self.content_hash = content_hash(source)
+        with _pdfium_lock:
+            self._pdf = pdfium.PdfDocument(source)
+            # 頁數直接由文件取得，不需要渲染
+            self.page_count = len(self._pdf)
+        self.scale = scale
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-preview")
+
+    def _render(self, index):
+        cache = get_page_cache()
+        key = page_key(self.content_hash, index, self.scale)
+        image = cache.get(key)
+        if image is not None:
+            return image
+
+        with _pdfium_lock:
+            page = self._pdf[index]
+            try:
+                pil_image = page.render(scale=self.scale).to_pil()
+            finally:
+                page.close()
+        image = encode_page(pil_image)
+        cache.set(key, image)
+        return image
+
+    def page_image(self, index, prefetch=PDF_PREVIEW_PREFETCH):
+        """
+        取得第 index 頁（從 0 開始）的圖像，並在背景預先渲染相鄰頁面
+
+        Args:
+            index: 頁碼
+            prefetch: 預先渲染前後各幾頁
+
+        Returns:
+            bytes: 壓縮後的頁面圖像（PDF_PAGE_FORMAT 格式）
+        """
+        neighbours = [i for offset in range(1, prefetch + 1) for i in (index + offset, index - offset) if 0 <= i < self.page_count]
+        with self._lock:
+            # 只保留目前頁與相鄰頁
+            for i in [i for i in self._pages if i != index and i not in neighbours]:
+                self._pages.pop(i).cancel()
+            # 目前頁先送出，相鄰頁排在其後
+            for i in [index] + neighbours:
+                if i not in self._pages:
+                    self._pages[i] = self._executor.submit(self._render, i)
+            future = self._pages[index]
+        return future.result()
+
+@st.cache_resource(max_entries=PDF_PREVIEW_MAX_DOCUMENTS, ttl=PDF_PREVIEW_TTL)
+def _open_preview(source_key, _load):
+    """依來源鍵快取預覽文件，_load 只在第一次開啟時呼叫，返回 PDF 的 bytes 或檔案路徑"""
+    return PdfPreview(_load())
+
+def open_uploaded_pdf(uploaded_file):
+    """
+    開啟上傳檔案的預覽文件（同一個上傳檔案只開啟一次）
+
+    暫存於磁碟的 StagedFile 直接以路徑開啟，其他上傳檔案才讀取內容
+    """
+    if hasattr(uploaded_file, "path"):
+        return _open_preview(("staged", uploaded_file.file_id), lambda: uploaded_file.path)
+    return _open_preview(("upload", uploaded_file.file_id), uploaded_file.getvalue)
+
+def open_pdf_path(pdf_path, timeout=PDF_PREVIEW_TIMEOUT):
+    """下載並開啟後端 PDF 的預覽文件（後端每次上傳的 PDF 路徑皆不同，同一路徑只下載一次）"""
+    def load():
+        response = get_session().get(f"{API_BASE_URL}/{pdf_path}", timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    return _open_preview(("path", pdf_path), load)
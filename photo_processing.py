@@ -0,0 +1,72 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# 上傳前的照片處理設定：是否處理、最長邊像素、輸出格式（JPEG / WEBP）與品質
+UPLOAD_PHOTO_COMPRESS = os.getenv("UPLOAD_PHOTO_COMPRESS", "true").lower() in ("1", "true", "yes")
+UPLOAD_PHOTO_MAX_EDGE = int(os.getenv("UPLOAD_PHOTO_MAX_EDGE", "2048"))
+UPLOAD_PHOTO_FORMAT = os.getenv("UPLOAD_PHOTO_FORMAT", "JPEG").upper()
+UPLOAD_PHOTO_QUALITY = int(os.getenv("UPLOAD_PHOTO_QUALITY", "80"))
+
+# 保留的拍攝時間 EXIF 欄位：DateTime（IFD0）與 Exif IFD 中的 DateTimeOriginal / DateTimeDigitized 及其時區、次秒
+_EXIF_IFD = 0x8769
+_KEEP_IFD0_TAGS = (0x0132,)
+_KEEP_EXIF_TAGS = (0x9003, 0x9004, 0x9010, 0x9011, 0x9012, 0x9290, 0x9291, 0x9292)
+
+_FORMATS = {
+    "JPEG": ("image/jpeg", ".jpg"),
+    "WEBP": ("image/webp", ".webp"),
+}
+if UPLOAD_PHOTO_FORMAT not in _FORMATS:
+    UPLOAD_PHOTO_FORMAT = "JPEG"
+
+def _timestamp_exif(image):
+    """只保留拍攝時間的 EXIF（不含方向、GPS、相機資訊等）"""
+    source = image.getexif()
+    exif = Image.Exif()
+    for tag in _KEEP_IFD0_TAGS:
+        if tag in source:
+            exif[tag] = source[tag]
+    source_ifd = source.get_ifd(_EXIF_IFD)
+    exif_ifd = {tag: source_ifd[tag] for tag in _KEEP_EXIF_TAGS if tag in source_ifd}
+    if exif_ifd:
+        exif.get_ifd(_EXIF_IFD).update(exif_ifd)
+    return exif
+
+def compress_photo(source, filename, max_edge=UPLOAD_PHOTO_MAX_EDGE, format=UPLOAD_PHOTO_FORMAT, quality=UPLOAD_PHOTO_QUALITY):
+    """
+    上傳前處理照片：依 EXIF 方向轉正、縮小至最長邊 max_edge 像素並重新壓縮，
+    移除 GPS、相機等其他中繼資料，只保留拍攝時間與色彩描述檔
+
+    Args:
+        source: 原始照片內容（bytes）、檔案路徑或檔案物件
+        filename: 原始檔名（副檔名會依輸出格式調整）
+        max_edge: 最長邊像素
+        format: 輸出格式，"JPEG" 或 "WEBP"
+        quality: 壓縮品質（1-100）
+
+    Returns:
+        tuple: (處理後的照片 bytes, MIME 類型, 檔名)
+    """
+    mimetype, extension = _FORMATS[format]
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        exif = _timestamp_exif(image)
+        icc_profile = image.info.get("icc_profile")
+
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        options = {"quality": quality, "exif": exif.tobytes()}
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        if format == "JPEG":
+            options["optimize"] = True
+        image.save(output, format=format, **options)
+
+    return output.getvalue(), mimetype, os.path.splitext(filename)[0] + extension
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from api import get_inspections_with_photos
+from utils import DEFAULT_REPORT_BACKEND, REPORT_SERVER_BACKEND, generate_report, generate_report_on_server
+
+# 報表工作設定：同時執行的工作數、報表檔案存放位置與保留時間（秒）
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_DIR = os.getenv("REPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "frontend_eng", "reports"))
+REPORT_JOB_TTL = float(os.getenv("REPORT_JOB_TTL", str(24 * 60 * 60)))
+
+class ReportJob:
+    """單一報表工作的狀態與進度"""
+
+    def __init__(self, job_id, inspection_ids, profile, backend="local"):
+        self.id = job_id
+        self.inspection_ids = inspection_ids
+        self.profile = profile
+        self.backend = backend  # local / server
+        self.status = "queued"  # queued / running / done / failed
+        self.inspections_done = 0
+        self.inspections_total = len(inspection_ids)
+        self.pages_done = 0
+        self.pages_total = 0
+        self.error = None
+        self.warnings = []
+        self.path = None
+        self.created_at = time.time()
+
+    def set_progress(self, inspections_done, inspections_total, pages_done, pages_total):
+        self.inspections_done = inspections_done
+        self.inspections_total = inspections_total
+        self.pages_done = pages_done
+        self.pages_total = pages_total
+
+    @property
+    def fraction(self):
+        """整體進度（0 ~ 1），以照片頁數為主，沒有照片頁時以抽查數計算"""
+        if self.status == "done":
+            return 1.0
+        if self.pages_total:
+            return min(1.0, self.pages_done / self.pages_total)
+        if self.inspections_total:
+            return min(1.0, self.inspections_done / self.inspections_total)
+        return 0.0
+
+class ReportJobManager:
+    """
+    在背景執行緒中生成報表，完成的報表存於磁碟
+
+    相同的抽查選擇（編號、報表大小與生成方式相同）在排隊或生成中時共用同一個工作；
+    已完成的工作不重複使用，重新列印一律生成新的報表，內容未變更的抽查由報表片段快取直接取得。
+    """
+
+    def __init__(self, directory=REPORT_JOB_DIR, workers=REPORT_JOB_WORKERS, ttl=REPORT_JOB_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._jobs = {}
+        self._active = {}  # 工作鍵對應排隊或生成中的工作
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-job")
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def job_key(inspection_ids, profile, backend="local"):
+        """以抽查編號、報表大小與生成方式計算工作鍵（用於合併同時送出的相同工作）"""
+        payload = json.dumps([list(inspection_ids), profile, backend], default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def _artifact_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.pdf")
+
+    def submit(self, inspection_ids, profile, backend=DEFAULT_REPORT_BACKEND):
+        """
+        送出報表工作，相同選擇的工作正在排隊或生成中時直接返回其編號
+
+        Args:
+            inspection_ids: 抽查編號列表（依報表順序）
+            profile: 報表大小設定（本機生成時使用）
+            backend: 生成方式，"local" 或 "server"（見 utils.generate_report_on_server）
+
+        Returns:
+            str: 工作編號
+        """
+        inspection_ids = [int(inspection_id) for inspection_id in inspection_ids]
+        if backend == "server" and not REPORT_SERVER_BACKEND:
+            raise ValueError("伺服器生成未啟用（REPORT_SERVER_BACKEND）")
+        key = self.job_key(inspection_ids, profile, backend)
+
+        self.sweep()
+        with self._lock:
+            job = self._active.get(key)
+            if job and job.status in ("queued", "running"):
+                return job.id
+
+            job = ReportJob(uuid.uuid4().hex, inspection_ids, profile, backend)
+            self._jobs[job.id] = job
+            self._active[key] = job
+
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id):
+        """
+        取得工作狀態，不存在時返回 None
+
+        程式重新啟動後，記憶體中的工作已不存在，但報表檔案仍在保留時間內時，以已完成的工作返回
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job
+            path = self._artifact_path(job_id)
+            if not re.fullmatch(r"[0-9a-f]{32}", job_id) or not os.path.exists(path):
+                return None
+            job = ReportJob(job_id, [], None)
+            job.status = "done"
+            job.path = path
+            job.created_at = os.path.getmtime(path)
+            self._jobs[job_id] = job
+            return job
+
+    def _run(self, job):
+        job.status = "running"
+        try:
+            # 報表直接寫入暫存檔再改名，避免讀到未完成的檔案，也不在記憶體中保留整份報表
+            path = self._artifact_path(job.id)
+            tmp_path = f"{path}.tmp"
+            try:
+                errors = {}
+                with open(tmp_path, "wb") as f:
+                    if job.backend == "server":
+                        pdf = generate_report_on_server(job.inspection_ids, progress=job.set_progress, output=f, errors=errors)
+                    else:
+                        inspections = [data for data in get_inspections_with_photos(job.inspection_ids) if data]
+                        pdf = generate_report(inspections, job.profile, progress=job.set_progress, output=f, errors=errors)
+                    if not pdf:
+                        raise ValueError("合併 PDF 失敗，請確認選擇的報表有效。")
+                job.warnings = [f"無法取得或生成，已略過: {source}（{error}）" for source, error in errors.items()]
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            job.path = path
+            job.status = "done"
+        except Exception as e:
+            print(f"生成報表時發生錯誤: {e}")
+            job.error = str(e)
+            job.status = "failed"
+
+    def sweep(self):
+        """刪除超過保留時間的報表檔案與工作"""
+        expires_before = time.time() - self.ttl
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.created_at < expires_before and job.status in ("done", "failed")]:
+                del self._jobs[job_id]
+            for key in [key for key, job in self._active.items() if job.status in ("done", "failed")]:
+                del self._active[key]
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < expires_before:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+@st.cache_resource
+def get_report_job_manager():
+    """取得全域共用的報表工作管理器"""
+    return ReportJobManager()
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 暫存上傳檔案的設定：存放位置、每個工作階段的容量上限、保留時間與清理間隔（秒）
+STAGING_DIR = os.getenv("STAGING_DIR", os.path.join(tempfile.gettempdir(), "frontend_eng", "staging"))
+STAGING_QUOTA_BYTES = int(os.getenv("STAGING_QUOTA_BYTES", str(200 * 1024 * 1024)))
+STAGING_TTL = float(os.getenv("STAGING_TTL", str(12 * 60 * 60)))
+STAGING_SWEEP_INTERVAL = float(os.getenv("STAGING_SWEEP_INTERVAL", "600"))
+# 工作階段結束後保留的秒數（避免重新連線時檔案已被刪除）
+STAGING_GRACE = float(os.getenv("STAGING_GRACE", "300"))
+
+_CHUNK_SIZE = 1024 * 1024
+
+class StagingQuotaError(Exception):
+    """暫存檔案超過工作階段容量上限"""
+
+class StagedFile:
+    """
+    暫存於磁碟的上傳檔案，session_state 只保存此物件
+
+    提供與 UploadedFile 相同的 name / type / size / file_id / getvalue()，可直接取代 UploadedFile 使用。
+    """
+
+    def __init__(self, path, name, type, size):
+        self.path = path
+        self.name = name
+        self.type = type
+        self.size = size
+        self.file_id = os.path.basename(path)
+
+    def open(self):
+        """以二進位模式開啟暫存檔"""
+        return open(self.path, "rb")
+
+    def getvalue(self):
+        """讀取整個檔案內容"""
+        with self.open() as f:
+            return f.read()
+
+class StagingStore:
+    """單一工作階段的暫存目錄，總大小不超過 quota 位元組"""
+
+    def __init__(self, directory, quota=STAGING_QUOTA_BYTES):
+        self.directory = directory
+        self.quota = quota
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def used_bytes(self):
+        """目前暫存檔案的總大小"""
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def add(self, uploaded_file):
+        """
+        將上傳檔案分段寫入暫存目錄
+
+        Args:
+            uploaded_file: st.file_uploader 返回的 UploadedFile
+
+        Returns:
+            StagedFile: 暫存檔案
+
+        Raises:
+            StagingQuotaError: 加入後超過容量上限
+        """
+        used = self.used_bytes
+        if used + uploaded_file.size > self.quota:
+            raise StagingQuotaError(
+                f"暫存空間不足：已使用 {used / 1024 / 1024:.1f} MB，上限 {self.quota / 1024 / 1024:.0f} MB"
+            )
+
+        path = os.path.join(self.directory, uuid.uuid4().hex)
+        uploaded_file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(uploaded_file, f, _CHUNK_SIZE)
+        # 更新目錄時間，清理時以此判斷最後使用時間
+        os.utime(self.directory)
+        return StagedFile(path, uploaded_file.name, uploaded_file.type, os.path.getsize(path))
+
+    def discard(self, staged_file):
+        """刪除單一暫存檔案"""
+        try:
+            os.remove(staged_file.path)
+        except OSError:
+            pass
+
+    def clear(self):
+        """刪除此工作階段的所有暫存檔案"""
+        for entry in os.scandir(self.directory):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def sweep(directory=STAGING_DIR, ttl=STAGING_TTL, grace=STAGING_GRACE):
+    """刪除已結束工作階段（超過 grace 秒）或超過保留時間未使用的暫存目錄"""
+    if not os.path.isdir(directory):
+        return
+    runtime = Runtime.instance() if Runtime.exists() else None
+    now = time.time()
+    for entry in os.scandir(directory):
+        try:
+            if not entry.is_dir():
+                continue
+            idle = now - entry.stat().st_mtime
+            session_ended = runtime is not None and not runtime.is_active_session(entry.name)
+            if idle > ttl or (session_ended and idle > grace):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+@st.cache_resource
+def _start_sweeper():
+    """啟動定期清理暫存目錄的背景執行緒（每個程序一次）"""
+    def run():
+        while True:
+            sweep()
+            time.sleep(STAGING_SWEEP_INTERVAL)
+
+    thread = threading.Thread(target=run, name="staging-sweeper", daemon=True)
+    thread.start()
+    return thread
+
+def get_staging_store():
+    """取得目前工作階段的暫存目錄（以 session id 區分）"""
+    _start_sweeper()
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx is not None else "default"
+    return StagingStore(os.path.join(STAGING_DIR, session_id))
@@ -28,7 +28,7 @@ def login_info():
         st.warning("""
         - 系統目前部署在我的個人主機  
         - 每個專案 **限制 100 MB**  
-        - 請將照片**壓縮後再上傳**  
+        - 照片上傳時會**自動縮小並壓縮**  
         - 如需部署在指定主機，歡迎聯繫我！
                 """)
 
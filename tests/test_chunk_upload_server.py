@@ -0,0 +1,86 @@
+"""
+api.chunked_upload 與 chunk_upload_server 的整合測試：續傳、日誌清除與分段雜湊檢查
+"""
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+import api
+from chunk_upload_server import UploadStore, make_handler
+
+CHUNK_SIZE = 1024
+DATA = os.urandom(CHUNK_SIZE * 3)
+TARGET = {"type": "inspection_pdf", "inspection_id": 1}
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / "uploads"))
+
+@pytest.fixture
+def start_server(store):
+    """在空閒埠啟動共用 store 的替代後端，返回其 URL"""
+    servers = []
+
+    def start(fail_rate=0.0):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(store, fail_rate=fail_rate))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "journal"
+    monkeypatch.setattr(api, "API_UPLOAD_JOURNAL_DIR", str(directory))
+    monkeypatch.setattr(api, "API_BACKOFF_FACTOR", 0)
+    return directory
+
+def test_resumes_from_journal_after_failure(store, start_server, journal_dir, monkeypatch):
+    """第一段完成後分段全部失敗，再次上傳只傳送未完成的分段"""
+    healthy = start_server()
+    failing = start_server(fail_rate=1.0)
+    uploaded = []
+    put_chunk = store.put_chunk
+
+    def record_chunk(upload_id, index, data):
+        uploaded.append(index)
+        put_chunk(upload_id, index, data)
+
+    monkeypatch.setattr(store, "put_chunk", record_chunk)
+
+    # 第一段完成後改連到總是回應 503 的後端
+    monkeypatch.setattr(api, "API_BASE_URL", healthy)
+    result = api.chunked_upload("a.pdf", DATA, TARGET, chunk_size=CHUNK_SIZE,
+                                progress=lambda done, total: monkeypatch.setattr(api, "API_BASE_URL", failing))
+    assert result["resumable"] is True
+    assert uploaded == [0]
+    assert len(os.listdir(journal_dir)) == 1
+
+    monkeypatch.setattr(api, "API_BASE_URL", healthy)
+    result = api.chunked_upload("a.pdf", DATA, TARGET, chunk_size=CHUNK_SIZE)
+    assert "error" not in result
+    assert result["pdf_path"] == "uploads/a.pdf"
+    assert uploaded == [0, 1, 2]
+
+def test_journal_removed_after_completion(start_server, journal_dir, monkeypatch):
+    monkeypatch.setattr(api, "API_BASE_URL", start_server())
+    result = api.chunked_upload("a.pdf", DATA, TARGET, chunk_size=CHUNK_SIZE)
+    assert "error" not in result
+    assert os.listdir(journal_dir) == []
+
+def test_rejects_chunk_with_bad_checksum(start_server):
+    url = start_server()
+    response = requests.post(f"{url}/api/uploads/", json={"filename": "a.pdf", "size": len(DATA), "chunk_size": CHUNK_SIZE, "sha256": "0" * 64})
+    upload_id = response.json()["upload_id"]
+    response = requests.put(f"{url}/api/uploads/{upload_id}/chunks/0", data=DATA[:CHUNK_SIZE],
+                            headers={"X-Chunk-Sha256": "0" * 64})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Chunk checksum mismatch"
+    assert requests.get(f"{url}/api/uploads/{upload_id}").json()["received"] == []
@@ -0,0 +1,104 @@
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from PIL import Image, ImageOps
+
+from api import API_BASE_URL, get_session
+from cache import DiskCache
+
+# 縮圖設定
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "480"))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "frontend_eng", "thumbnails"))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# 下載照片的逾時秒數與預先下載的執行緒數
+PHOTO_TIMEOUT = float(os.getenv("PHOTO_TIMEOUT", "30"))
+THUMBNAIL_PREFETCH_WORKERS = int(os.getenv("THUMBNAIL_PREFETCH_WORKERS", "8"))
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """取得全域共用的縮圖磁碟快取"""
+    return DiskCache(THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES)
+
+def photo_url(photo_path):
+    """取得照片的完整 URL"""
+    return f"{API_BASE_URL}/{photo_path}"
+
+def fetch_photo(photo_path, timeout=PHOTO_TIMEOUT):
+    """下載原始照片，HTTP 錯誤時拋出例外"""
+    response = get_session().get(photo_url(photo_path), timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+def make_thumbnail(image_bytes, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """將照片依 EXIF 方向轉正後縮小為最長邊 size 像素的 JPEG"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
+
+def thumbnail_key(photo_path, size=THUMBNAIL_SIZE):
+    """縮圖快取鍵：照片路徑與尺寸的雜湊值（後端每次上傳的照片路徑皆不同）"""
+    return hashlib.sha256(f"{photo_path}|{size}|{THUMBNAIL_QUALITY}".encode("utf-8")).hexdigest() + ".jpg"
+
+def get_cached_thumbnail(photo_path, size=THUMBNAIL_SIZE):
+    """只從快取取得縮圖，未快取時回傳 None"""
+    return get_thumbnail_cache().get(thumbnail_key(photo_path, size))
+
+def get_thumbnail(photo_path, size=THUMBNAIL_SIZE, timeout=PHOTO_TIMEOUT):
+    """
+    取得照片縮圖，第一次會下載原圖並縮小後存入磁碟快取
+
+    Args:
+        photo_path: 後端回傳的照片路徑（photo_path / 檔案路徑）
+        size: 縮圖最長邊像素
+        timeout: 下載逾時秒數
+
+    Returns:
+        bytes: JPEG 縮圖
+    """
+    thumbnail = get_cached_thumbnail(photo_path, size)
+    if thumbnail is not None:
+        return thumbnail
+
+    thumbnail = make_thumbnail(fetch_photo(photo_path, timeout=timeout), size)
+    get_thumbnail_cache().set(thumbnail_key(photo_path, size), thumbnail)
+    return thumbnail
+
+def prefetch_thumbnails(photo_paths, size=THUMBNAIL_SIZE, max_workers=THUMBNAIL_PREFETCH_WORKERS, timeout=PHOTO_TIMEOUT):
+    """
+    以有限執行緒數並行下載尚未快取的縮圖，單張失敗不影響其他照片
+
+    Args:
+        photo_paths: 照片路徑列表
+        size: 縮圖最長邊像素
+        max_workers: 同時下載的照片數上限
+        timeout: 單張照片的下載逾時秒數
+
+    Returns:
+        dict: 下載失敗的照片路徑與例外
+    """
+    cache = get_thumbnail_cache()
+    missing = [path for path in dict.fromkeys(photo_paths) if cache.path(thumbnail_key(path, size)) is None]
+    if not missing:
+        return {}
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+        futures = {path: executor.submit(get_thumbnail, path, size, timeout) for path in missing}
+        for path, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors[path] = e
+    return errors
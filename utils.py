@@ -1,5 +1,5 @@
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Image, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Image, Paragraph, Spacer, Table, TableStyle, PageBreak, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.lib import colors
@@ -7,27 +7,88 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import io
 import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
 from datetime import datetime
 
-from api import API_BASE_URL
+from api import API_BASE_URL, get_session, generate_inspection_pdf
+from thumbnails import fetch_photo, make_thumbnail
+from cache import DiskCache
 
 # with open("data.json", "r", encoding="utf-8") as f:
 #     data = json.load(f)
 
-def generate_pdf(data):
-    """生成 PDF 報表，返回 PDF 的 bytes 以便用於 Streamlit 的 download_button"""
-    # 註冊中文字型
-    import io
-    
-    font_path = os.path.join(os.path.dirname(__file__), "fonts", "NotoSansTC-Regular.ttf")
-    pdfmetrics.registerFont(TTFont('NotoSansTC', font_path))
-    chinese_font = 'NotoSansTC'
+# 每頁照片數
+PHOTOS_PER_PAGE = 3
 
-    # 使用 BytesIO 而不是實體文件
-    buffer = io.BytesIO()
+# 照片在報表中的顯示尺寸上限（公分），實際高度依頁面可用高度縮小，使每頁 PHOTOS_PER_PAGE 張照片排在同一頁
+PHOTO_CELL_CM = 8
+# 拍攝日期、說明列的高度（公分）
+PHOTO_TEXT_ROW_CM = 1
+# 表格儲存格上下內距（點）
+_CELL_PADDING = 3
 
-    # 創建 PDF 文件
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=1*cm, leftMargin=1*cm, topMargin=1*cm, bottomMargin=1*cm)
+# 報表大小設定：照片解析度（DPI）與 JPEG 品質
+REPORT_PROFILES = {
+    "draft": {"label": "草稿（檔案最小）", "dpi": 100, "quality": 60},
+    "standard": {"label": "標準", "dpi": 150, "quality": 75},
+    "archival": {"label": "存檔（高畫質）", "dpi": 300, "quality": 90},
+}
+DEFAULT_REPORT_PROFILE = os.getenv("REPORT_PROFILE", "standard")
+
+# 報表生成方式：預設本機排版；後端生成需以 REPORT_SERVER_BACKEND 啟用（會改寫抽查的 pdf_path，見 generate_report_on_server）
+REPORT_BACKENDS = {
+    "local": "本機生成",
+    "server": "伺服器生成",
+}
+DEFAULT_REPORT_BACKEND = "local"
+REPORT_SERVER_BACKEND = os.getenv("REPORT_SERVER_BACKEND", "false").lower() in ("1", "true", "yes")
+# 同時請求後端生成的抽查數
+REPORT_SERVER_WORKERS = int(os.getenv("REPORT_SERVER_WORKERS", "4"))
+
+# 同時下載照片的執行緒數
+REPORT_IMAGE_WORKERS = int(os.getenv("REPORT_IMAGE_WORKERS", "8"))
+
+# 報表排版的程序數（1 表示在目前程序中排版）與每個程序的記憶體上限（MB，0 表示不限制）
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+REPORT_WORKER_MEMORY_MB = int(os.getenv("REPORT_WORKER_MEMORY_MB", "2048"))
+# 有照片的抽查達到此數量才使用程序池（少量時啟動程序的成本高於平行排版的效益）
+REPORT_PARALLEL_MIN_INSPECTIONS = int(os.getenv("REPORT_PARALLEL_MIN_INSPECTIONS", "4"))
+
+# 合併 PDF 設定：下載逾時秒數、串流下載的區塊大小，以及輸出暫存在記憶體的上限（超過後改存磁碟）
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "60"))
+PDF_CHUNK_SIZE = int(os.getenv("PDF_CHUNK_SIZE", str(1024 * 1024)))
+PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(16 * 1024 * 1024)))
+# 同時下載原始抽查表 PDF 的執行緒數
+PDF_DOWNLOAD_WORKERS = int(os.getenv("PDF_DOWNLOAD_WORKERS", "4"))
+
+# 字型與樣式只在第一次使用時建立一次，之後所有報表共用
+_styles = None
+_styles_lock = threading.Lock()
+
+def _get_styles():
+    """返回共用的 (標題, 副標題, 一般文字) 樣式，第一次呼叫時才註冊字型並建立樣式"""
+    global _styles
+    if _styles is None:
+        with _styles_lock:
+            if _styles is None:
+                _styles = _create_styles()
+    return _styles
+
+def _create_styles():
+    """註冊中文字型並建立 (標題, 副標題, 一般文字) 樣式"""
+    # 註冊中文字型（TTFont 嵌入時只包含用到的字元子集）
+    chinese_font = 'NotoSansTC'
+    if chinese_font not in pdfmetrics.getRegisteredFontNames():
+        font_path = os.path.join(os.path.dirname(__file__), "fonts", "NotoSansTC-Regular.ttf")
+        pdfmetrics.registerFont(TTFont(chinese_font, font_path))
 
     # 獲取樣式並創建中文樣式
     styles = getSampleStyleSheet()
@@ -69,35 +130,158 @@ def generate_pdf(data):
     sub_title_style = styles['ChineseSubTitle'] if chinese_font else styles['Normal']
     normal_style = styles['ChineseNormal'] if chinese_font else styles['Normal']
 
-    # 創建內容元素列表
-    elements = []
+    return title_style, sub_title_style, normal_style
+
+def _resize_report_image(image_bytes, profile):
+    """將照片縮小為報表顯示尺寸所需的解析度，重新壓縮為 JPEG"""
+    settings = REPORT_PROFILES[profile]
+    max_pixels = int(PHOTO_CELL_CM / 2.54 * settings["dpi"])
+    return make_thumbnail(image_bytes, size=max_pixels, quality=settings["quality"])
+
+def _unique_photo_paths(photos):
+    return list(dict.fromkeys(photo["photo_path"] for photo in photos if photo.get("photo_path")))
+
+def fetch_report_photos(photos, max_workers=REPORT_IMAGE_WORKERS, failures=None):
+    """
+    並行下載報表用照片原檔（不縮小）
+
+    Args:
+        failures: 可選的字典，記錄下載失敗的 photo_path 與錯誤訊息
+
+    Returns:
+        dict: photo_path 對應的原始 bytes，下載失敗者為 None
+    """
+    photo_paths = _unique_photo_paths(photos)
+    if not photo_paths:
+        return {}
+
+    def fetch(photo_path):
+        try:
+            return fetch_photo(photo_path)
+        except Exception as e:
+            print(f"下載照片時發生錯誤: {photo_path} {e}")
+            if failures is not None:
+                failures[photo_path] = f"下載失敗: {e}"
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(photo_paths)))) as executor:
+        return dict(zip(photo_paths, executor.map(fetch, photo_paths)))
+
+def _resize_report_images(raw_images, profile, failures=None):
+    """縮小已下載的照片，處理失敗者為 None 並記錄於 failures（未下載的照片不重複記錄）"""
+    images = {}
+    for photo_path, image_bytes in raw_images.items():
+        try:
+            images[photo_path] = _resize_report_image(image_bytes, profile) if image_bytes else None
+        except Exception as e:
+            print(f"處理照片時發生錯誤: {photo_path} {e}")
+            if failures is not None:
+                failures[photo_path] = f"無法處理: {e}"
+            images[photo_path] = None
+    return images
+
+def prepare_report_images(photos, profile=DEFAULT_REPORT_PROFILE, max_workers=REPORT_IMAGE_WORKERS, failures=None):
+    """
+    並行下載並縮小報表用照片
+
+    Args:
+        photos: 照片資料列表（含 photo_path）
+        profile: 報表大小設定，REPORT_PROFILES 的鍵
+        max_workers: 同時下載的照片數上限
+        failures: 可選的字典，記錄下載或處理失敗的 photo_path 與錯誤訊息
+
+    Returns:
+        dict: photo_path 對應的 JPEG bytes，下載失敗者為 None
+    """
+    photo_paths = _unique_photo_paths(photos)
+    if not photo_paths:
+        return {}
+
+    def prepare(photo_path):
+        try:
+            image_bytes = fetch_photo(photo_path)
+        except Exception as e:
+            print(f"下載照片時發生錯誤: {photo_path} {e}")
+            if failures is not None:
+                failures[photo_path] = f"下載失敗: {e}"
+            return None
+        try:
+            return _resize_report_image(image_bytes, profile)
+        except Exception as e:
+            print(f"處理照片時發生錯誤: {photo_path} {e}")
+            if failures is not None:
+                failures[photo_path] = f"無法處理: {e}"
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(photo_paths)))) as executor:
+        return dict(zip(photo_paths, executor.map(prepare, photo_paths)))
+
+def _photo_row_height(header):
+    """照片列的高度：頁面可用高度扣除標題與文字列後平均分配，不超過 PHOTO_CELL_CM"""
+    frame_width, frame_height = _frame_size()
+    used = sum(p.wrap(frame_width, frame_height)[1] + p.getSpaceBefore() + p.getSpaceAfter() for p in header)
+    available = frame_height - used - PHOTOS_PER_PAGE * 2 * PHOTO_TEXT_ROW_CM * cm
+    # 保留少量高度，避免浮點誤差造成換頁
+    return min(PHOTO_CELL_CM * cm + 2 * _CELL_PADDING, (available - 1) / PHOTOS_PER_PAGE)
+
+def _photo_page_elements(data, photos, styles, images):
+    """建立一頁照片表的內容元素（標題、抽查表名稱與照片表格），列高固定使一組照片排在同一頁"""
+    title_style, sub_title_style, normal_style = styles
 
     # 標題與基本資料
-    elements.append(Paragraph(f"<b>抽查紀錄表照片</b>", title_style))
-    #放在最右邊
-    elements.append(Paragraph(f"抽查表名稱: {data.get('inspection_form_name', '')}", sub_title_style))
+    header = [
+        Paragraph(f"<b>抽查紀錄表照片</b>", title_style),
+        #放在最右邊
+        Paragraph(f"抽查表名稱: {data.get('inspection_form_name', '')}", sub_title_style),
+    ]
+    image_row_height = _photo_row_height(header)
+    image_size = max(1, image_row_height - 2 * _CELL_PADDING)
 
     # 定義表格的資料（合併所有照片內容）
     table_data = []
-    for idx, photo in enumerate(data["photos"], 1):
-        # 設定每行的高度
-        row_heights = [1* cm, 1 * cm, 8* cm]  # 不同的行高
-        
+    row_heights = []
+    for idx, photo in enumerate(photos, 1):
         # 表格資料放 metadata + 圖片
         table_data.append([Paragraph("拍攝日期", normal_style), Paragraph(photo["capture_date"], normal_style)])
         table_data.append([Paragraph("說明", normal_style), Paragraph(photo["caption"], normal_style)])
-        table_data.append([Paragraph("圖片", normal_style), Image(f"{API_BASE_URL}/{photo['photo_path']}", width=8 * cm, height=8 * cm, kind='proportional')])
+        image_bytes = images.get(photo['photo_path'])
+        if image_bytes:
+            image = Image(io.BytesIO(image_bytes), width=image_size, height=image_size, kind='proportional')
+        else:
+            image = Paragraph("無法取得照片", normal_style)
+        table_data.append([Paragraph("圖片", normal_style), image])
+        row_heights += [PHOTO_TEXT_ROW_CM * cm, PHOTO_TEXT_ROW_CM * cm, image_row_height]
 
     # 創建單一表格並設定樣式
-    table = Table(table_data, colWidths=[3 * cm, 12 * cm])
+    table = Table(table_data, colWidths=[3 * cm, 12 * cm], rowHeights=row_heights)
     table.setStyle(TableStyle([
         ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),  # 設定邊框
         ("VALIGN", (0, 0), (-1, -1), "TOP"),  # 垂直對齊
         ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),  # 設定背景顏色
         ("ALIGN", (0, 0), (-1, -1), "CENTER"),  # 水平對齊
+        ("TOPPADDING", (0, 0), (-1, -1), _CELL_PADDING),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), _CELL_PADDING),
     ]))
 
-    elements.append(table)
+    return header + [table]
+
+def _new_document(buffer):
+    """建立 A4 PDF 文件"""
+    return SimpleDocTemplate(buffer, pagesize=A4, rightMargin=1*cm, leftMargin=1*cm, topMargin=1*cm, bottomMargin=1*cm)
+
+def _frame_size():
+    """頁面內容區的 (寬, 高)：A4 扣除邊界與 Frame 預設的 6 點內距"""
+    return A4[0] - 2 * cm - 12, A4[1] - 2 * cm - 12
+
+def generate_pdf(data, profile=DEFAULT_REPORT_PROFILE):
+    """生成 PDF 報表，返回 PDF 的 bytes 以便用於 Streamlit 的 download_button"""
+    # 使用 BytesIO 而不是實體文件
+    buffer = io.BytesIO()
+
+    # 創建 PDF 文件
+    doc = _new_document(buffer)
+    images = prepare_report_images(data["photos"], profile)
+    elements = _photo_page_elements(data, data["photos"], _get_styles(), images)
 
     # 建立 PDF
     try:
@@ -110,64 +294,632 @@ def generate_pdf(data):
         print(f"生成 PDF 時發生錯誤: {e}")
         return None
 
-def merge_multiple_pdfs(pdf_files_list):
+class _PageMarker(Flowable):
+    """不佔空間的標記，繪製時記錄所在頁碼"""
+
+    def __init__(self, pages, key):
+        super().__init__()
+        self.pages = pages
+        self.key = key
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        self.pages[self.key] = self.canv.getPageNumber()
+
+def _inspection_elements(data, styles, images):
+    """建立單筆抽查所有照片頁的內容元素，頁與頁之間以 PageBreak 分隔"""
+    elements = []
+    photos = data.get('photos', [])
+    for j in range(0, len(photos), PHOTOS_PER_PAGE):
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(_photo_page_elements(data, photos[j:j + PHOTOS_PER_PAGE], styles, images))
+    return elements
+
+def _build_inspection_pages(data, images):
+    """以已縮小的照片生成單筆抽查的照片頁 PDF，沒有照片時返回 None"""
+    elements = _inspection_elements(data, _get_styles(), images)
+    if not elements:
+        return None
+
+    buffer = io.BytesIO()
+    _new_document(buffer).build(elements)
+    return buffer.getvalue()
+
+def _build_photo_pages(data, raw_images, profile):
+    """
+    在排版程序中執行：縮小照片並生成單筆抽查的照片頁 PDF
+
+    Returns:
+        tuple: (PDF bytes 或 None, 無法處理的 photo_path 對應錯誤訊息)
+    """
+    failures = {}
+    images = _resize_report_images(raw_images, profile, failures)
+    return _build_inspection_pages(data, images), failures
+
+def _init_report_worker(memory_limit_mb):
+    """排版程序初始化：設定記憶體上限"""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"無法設定排版程序記憶體上限: {e}")
+
+# 排版程序池，第一次使用時才建立
+_report_pool = None
+_report_pool_lock = threading.Lock()
+
+def _get_report_pool(workers):
+    global _report_pool
+    with _report_pool_lock:
+        if _report_pool is None or _report_pool._max_workers != workers:
+            if _report_pool is not None:
+                _report_pool.shutdown(wait=False)
+            # 使用 spawn 避免在多執行緒的 Streamlit 程序中 fork
+            _report_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_report_worker,
+                initargs=(REPORT_WORKER_MEMORY_MB,)
+            )
+        return _report_pool
+
+def _reset_report_pool():
+    global _report_pool
+    with _report_pool_lock:
+        if _report_pool is not None:
+            _report_pool.shutdown(wait=False)
+            _report_pool = None
+
+def _page_count(data):
+    """單筆抽查的照片頁數"""
+    return -(-len(data.get('photos', [])) // PHOTOS_PER_PAGE)
+
+def _generate_photo_pages_parallel(inspections, profile, workers, progress=None, failures=None, photo_failures=None):
+    """
+    以程序池平行生成每筆抽查的照片頁 PDF
+
+    照片原檔在送出前才逐筆下載，同時處理中的抽查最多 workers 筆，
+    主程序同時保留的原檔不超過這些抽查（而非整份報表）的大小；縮小與排版在排版程序中進行。
+    排版程序失敗（例如超過記憶體上限）的抽查重新下載照片，改在主程序中生成，仍失敗者記錄於 failures
+    （抽查在 inspections 中的索引 → 錯誤訊息）；無法下載或處理的照片記錄於 photo_failures（photo_path → 錯誤訊息）。
+
+    Returns:
+        list: 與 inspections 順序相同的 PDF bytes，沒有照片者為 None
+    """
+    if failures is None:
+        failures = {}
+    if photo_failures is None:
+        photo_failures = {}
+    photo_pages = [None] * len(inspections)
+    pages_total = sum(_page_count(data) for data in inspections)
+    pages_done = 0
+    inspections_done = sum(1 for data in inspections if not data.get('photos'))
+    in_flight = deque()
+
+    def collect():
+        # 依送出順序等待最早的抽查完成
+        nonlocal pages_done, inspections_done
+        index, future = in_flight.popleft()
+        data = inspections[index]
+        try:
+            photo_pages[index], resize_failures = future.result()
+            photo_failures.update(resize_failures)
+        except Exception as e:
+            print(f"排版程序生成 PDF 時發生錯誤，改在主程序中生成: {e}")
+            if isinstance(e, BrokenProcessPool):
+                _reset_report_pool()
+            try:
+                photo_pages[index], resize_failures = _build_photo_pages(data, fetch_report_photos(data['photos'], failures=photo_failures), profile)
+                photo_failures.update(resize_failures)
+            except Exception as e:
+                print(f"生成 PDF 時發生錯誤: {e}")
+                failures[index] = str(e)
+        pages_done += _page_count(data)
+        inspections_done += 1
+        if progress:
+            progress(inspections_done, len(inspections), pages_done, pages_total)
+
+    if progress:
+        progress(inspections_done, len(inspections), pages_done, pages_total)
+    for index, data in enumerate(inspections):
+        if not data.get('photos'):
+            continue
+        if len(in_flight) >= workers:
+            collect()
+        # 下一筆抽查的照片在其他抽查排版時下載；程序池在 collect 中損壞時會重新建立
+        raw_images = fetch_report_photos(data['photos'], failures=photo_failures)
+        in_flight.append((index, _get_report_pool(workers).submit(_build_photo_pages, data, raw_images, profile)))
+    while in_flight:
+        collect()
+    return photo_pages
+
+def _generate_photo_pages_single_pass(inspections, profile, progress=None, failures=None, photo_failures=None):
+    """
+    在同一份文件中一次排版所有抽查的照片頁
+
+    一次排版失敗時（例如某筆抽查的內容超出頁面），改為逐筆抽查個別排版，只有出錯的抽查沒有照片頁，
+    其錯誤訊息記錄於 failures（抽查在 inspections 中的索引 → 錯誤訊息）；
+    無法下載或處理的照片記錄於 photo_failures（photo_path → 錯誤訊息）。
+
+    Returns:
+        list: 與 inspections 順序相同的合併清單項目 (照片頁暫存檔, False, page_range) 或 (PDF bytes, False)，沒有照片者為 None
+    """
+    styles = _get_styles()
+    if failures is None:
+        failures = {}
+
+    # 先並行下載並縮小所有照片
+    images = prepare_report_images([photo for data in inspections for photo in data.get('photos', [])], profile, failures=photo_failures)
+
+    # 建立所有照片頁，並標記每筆抽查的起始頁
+    elements = []
+    page_starts = {}
+    for index, data in enumerate(inspections):
+        inspection_elements = _inspection_elements(data, styles, images)
+        if not inspection_elements:
+            continue
+        if elements:
+            elements.append(PageBreak())
+        elements.append(_PageMarker(page_starts, index))
+        elements.extend(inspection_elements)
+
+    pages_total = sum(_page_count(data) for data in inspections)
+
+    def on_progress(typ, value):
+        # 開始排版第 value 頁時回報前一頁已完成
+        if typ == 'PAGE' and progress:
+            progress(max(0, len(page_starts) - 1), len(inspections), value - 1, pages_total)
+
+    photo_pdf = None
+    if elements:
+        # 照片頁可能很大，超過 PDF_SPOOL_MAX_BYTES 後改存磁碟
+        buffer = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_BYTES)
+        try:
+            doc = _new_document(buffer)
+            doc.setProgressCallBack(on_progress)
+            doc.build(elements)
+            photo_pdf = buffer
+        except Exception as e:
+            buffer.close()
+            print(f"一次排版照片頁失敗，改為逐筆排版: {e}")
+            photo_pages = _build_each_inspection(inspections, images, progress, failures)
+            if progress:
+                progress(len(inspections), len(inspections), pages_total, pages_total)
+            return photo_pages
+
+    if progress:
+        progress(len(inspections), len(inspections), pages_total, pages_total)
+
+    # 每筆抽查的照片頁範圍為其起始頁到下一筆抽查的起始頁
+    starts = sorted(page_starts.items())
+    page_ranges = {
+        index: (start - 1, starts[k + 1][1] - 1 if k + 1 < len(starts) else None)
+        for k, (index, start) in enumerate(starts)
+    }
+
+    return [
+        (photo_pdf, False, page_ranges[index]) if photo_pdf and index in page_ranges else None
+        for index in range(len(inspections))
+    ]
+
+def _build_each_inspection(inspections, images, progress, failures):
+    """逐筆抽查個別排版照片頁，失敗的抽查記錄於 failures 並返回 None"""
+    photo_pages = []
+    pages_total = sum(_page_count(data) for data in inspections)
+    pages_done = 0
+    for index, data in enumerate(inspections):
+        if progress:
+            progress(index, len(inspections), pages_done, pages_total)
+        try:
+            pdf_bytes = _build_inspection_pages(data, images)
+            photo_pages.append((pdf_bytes, False) if pdf_bytes else None)
+        except Exception as e:
+            print(f"生成 PDF 時發生錯誤: {e}")
+            failures[index] = str(e)
+            photo_pages.append(None)
+        pages_done += _page_count(data)
+    return photo_pages
+
+# 報表片段快取設定：每筆抽查的完整片段（原始抽查表 PDF + 照片頁）存於磁碟
+REPORT_SEGMENT_CACHE_DIR = os.getenv("REPORT_SEGMENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "frontend_eng", "report_segments"))
+REPORT_SEGMENT_CACHE_MAX_BYTES = int(os.getenv("REPORT_SEGMENT_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+
+# 版面改變時調整此版本，使舊的片段失效
+REPORT_LAYOUT_VERSION = 1
+
+_segment_cache = None
+_segment_cache_lock = threading.Lock()
+
+def _get_segment_cache():
+    """取得共用的報表片段磁碟快取，第一次呼叫時才建立"""
+    global _segment_cache
+    if _segment_cache is None:
+        with _segment_cache_lock:
+            if _segment_cache is None:
+                _segment_cache = DiskCache(REPORT_SEGMENT_CACHE_DIR, REPORT_SEGMENT_CACHE_MAX_BYTES)
+    return _segment_cache
+
+def segment_key(data, profile):
+    """
+    報表片段的快取鍵：抽查欄位、照片（編號、說明、日期、路徑）、原始 PDF 路徑與報表大小的雜湊值
+    """
+    fields = {key: value for key, value in data.items() if key != 'photos'}
+    photos = [
+        [photo.get('id'), photo.get('caption'), photo.get('capture_date'), photo.get('photo_path')]
+        for photo in data.get('photos', [])
+    ]
+    payload = json.dumps([REPORT_LAYOUT_VERSION, profile, fields, photos], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest() + ".pdf"
+
+def generate_report(inspections, profile=DEFAULT_REPORT_PROFILE, workers=REPORT_WORKERS, progress=None, output=None, errors=None):
+    """
+    生成多筆抽查的完整報告，返回合併後 PDF 的檔案物件
+
+    每筆抽查的片段（原始抽查表 PDF + 照片頁）以內容雜湊快取於磁碟，
+    重新列印時只重新生成內容有變更的抽查。
+    需要生成的抽查中，有照片者達 REPORT_PARALLEL_MIN_INSPECTIONS 筆且 workers 大於 1 時，
+    照片頁由程序池平行排版；否則所有照片頁（每頁 PHOTOS_PER_PAGE 張）在同一份文件中一次排版完成。
+    原始抽查表 PDF 在排版照片頁的同時並行下載，下載失敗的檔案會被略過並記錄於 errors。
+
+    Args:
+        inspections: 抽查資料列表（含 photos 與 pdf_path）
+        profile: 報表大小設定，REPORT_PROFILES 的鍵
+        workers: 排版程序數
+        progress: 可選的進度回呼 progress(已完成抽查數, 抽查總數, 已完成照片頁數, 照片頁總數)
+        output: 可選的可寫入檔案物件，未指定時寫入暫存檔
+        errors: 可選的字典，記錄無法下載或讀取的原始 PDF 與錯誤訊息
+
+    Returns:
+        file: 合併後的 PDF 檔案物件（見 merge_multiple_pdfs），沒有任何頁面時返回 None
+    """
+    cache = _get_segment_cache()
+    keys = [segment_key(data, profile) for data in inspections]
+    segments = {}
+    readers = {}
+    # 先開啟已快取的片段，之後寫入新片段觸發淘汰時這些檔案仍可讀取
+    cached_files = [cache.open(key) for key in keys]
+
+    try:
+        # 只生成沒有快取的抽查
+        missing = [index for index, f in enumerate(cached_files) if f is None]
+        missing_inspections = [inspections[index] for index in missing]
+
+        # 已快取的抽查計入進度
+        inspections_offset = len(inspections) - len(missing)
+        pages_offset = sum(_page_count(data) for data, f in zip(inspections, cached_files) if f)
+
+        def missing_progress(inspections_done, inspections_total, pages_done, pages_total):
+            if progress:
+                progress(inspections_offset + inspections_done, inspections_offset + inspections_total,
+                         pages_offset + pages_done, pages_offset + pages_total)
+
+        # 原始抽查表 PDF 在排版照片頁的同時並行下載
+        pdf_urls = {index: f"{API_BASE_URL}/{data.get('pdf_path')}" for index, data in zip(missing, missing_inspections) if data.get('pdf_path')}
+        if errors is None:
+            errors = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(PDF_DOWNLOAD_WORKERS, len(pdf_urls)))) as executor:
+            downloads = start_pdf_downloads(pdf_urls.values(), executor)
+
+            layout_failures = {}
+            photo_failures = {}
+            if workers > 1 and sum(1 for data in missing_inspections if data.get('photos')) >= REPORT_PARALLEL_MIN_INSPECTIONS:
+                photo_pages = [
+                    (pdf_bytes, False) if pdf_bytes else None
+                    for pdf_bytes in _generate_photo_pages_parallel(missing_inspections, profile, workers, missing_progress, layout_failures, photo_failures)
+                ]
+            else:
+                photo_pages = _generate_photo_pages_single_pass(missing_inspections, profile, missing_progress, layout_failures, photo_failures)
+            for position, error in layout_failures.items():
+                errors[f"抽查 {missing_inspections[position].get('id')} 的照片頁"] = error
+            # 無法取得的照片在報表中以「無法取得照片」顯示
+            for photo_path, error in photo_failures.items():
+                errors[f"照片 {photo_path}"] = error
+
+            # 組合每筆抽查的片段（原始抽查表 PDF、照片頁）並存入快取，同時保留開啟的快取檔案供最後合併
+            # 不完整的片段（原始 PDF 下載失敗、照片頁排版失敗或有照片無法取得）不存入快取，下次列印時重試
+            # 一次排版的照片頁為所有片段共用的同一份文件，只準備一次；其他來源在片段合併後即關閉
+            shared = {id(photo_page[0]) for photo_page in photo_pages if photo_page and len(photo_page) > 2}
+            for index, photo_page in zip(missing, photo_pages):
+                pdf_files_list = []
+                if index in pdf_urls:
+                    pdf_files_list.append((pdf_urls[index], True))
+                if photo_page:
+                    pdf_files_list.append(photo_page)
+                if not pdf_files_list:
+                    continue
+
+                segment_errors = {}
+                segment = merge_multiple_pdfs(pdf_files_list, readers=readers, downloads=downloads, errors=segment_errors)
+                for key in [key for key in readers if key not in shared]:
+                    readers.pop(key).close()
+                errors.update(segment_errors)
+                photos = inspections[index].get('photos', [])
+                incomplete = (
+                    segment_errors
+                    or (photos and not photo_page)
+                    or any(photo_path in photo_failures for photo_path in _unique_photo_paths(photos))
+                )
+                if segment and not incomplete:
+                    with segment:
+                        cached_files[index] = cache.set_file(keys[index], lambda f: shutil.copyfileobj(segment, f), keep_open=True)
+                elif segment:
+                    segments[index] = segment
+
+        # 依抽查順序組合所有片段
+        pdf_files_list = []
+        for index, f in enumerate(cached_files):
+            if f:
+                pdf_files_list.append((f, False))
+            elif index in segments:
+                pdf_files_list.append((segments[index], False))
+
+        return merge_multiple_pdfs(pdf_files_list, output=output, errors=errors)
+    finally:
+        for f in [*cached_files, *segments.values(), *readers.values()]:
+            if f:
+                f.close()
+
+def generate_report_on_server(inspection_ids, workers=REPORT_SERVER_WORKERS, progress=None, output=None, errors=None):
+    """
+    由後端 /api/inspections/{id}/generate-pdf 生成每筆抽查的報告，再依抽查順序合併
+
+    此端點會寫入資料：依 api_openapi.json，它返回 pdf_path 已更新的 Inspection，而 Inspection 只有單一 pdf_path，
+    因此無法確認使用者上傳的原始抽查表不會被取代（取代後本機列印會把生成的報告當作原始抽查表合併）。
+    後端生成的報告也不包含上傳的原始抽查表頁面。只有在 REPORT_SERVER_BACKEND 啟用且使用者明確選擇時才使用。
+
+    Args:
+        inspection_ids: 抽查編號列表（依報表順序）
+        workers: 同時請求後端生成的抽查數
+        progress: 可選的進度回呼 progress(已完成抽查數, 抽查總數, 0, 0)
+        output: 可選的可寫入檔案物件，未指定時寫入暫存檔
+        errors: 可選的字典，記錄生成或下載失敗的抽查與錯誤訊息
+
+    Returns:
+        file: 合併後的 PDF 檔案物件（見 merge_multiple_pdfs），沒有任何頁面時返回 None
+    """
+    if errors is None:
+        errors = {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(inspection_ids)))) as executor:
+        futures = {executor.submit(generate_inspection_pdf, inspection_id): inspection_id for inspection_id in inspection_ids}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress(done, len(inspection_ids), 0, 0)
+
+    pdf_files_list = []
+    for inspection_id in inspection_ids:
+        result = results[inspection_id]
+        if "error" in result:
+            errors[f"抽查 {inspection_id}"] = result["error"]
+        elif not result.get("pdf_path"):
+            errors[f"抽查 {inspection_id}"] = "後端未返回 PDF 路徑"
+        else:
+            pdf_files_list.append((f"{API_BASE_URL}/{result['pdf_path']}", True))
+
+    return merge_multiple_pdfs(pdf_files_list, output=output, errors=errors)
+
+def _download_pdf(url, timeout=PDF_DOWNLOAD_TIMEOUT):
+    """以串流方式將 PDF 下載到有檔名的暫存檔（關閉後自動刪除），返回已移到開頭的檔案物件"""
+    with get_session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        spool = tempfile.NamedTemporaryFile(suffix=".pdf")
+        try:
+            for chunk in response.iter_content(chunk_size=PDF_CHUNK_SIZE):
+                spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+    spool.seek(0)
+    return spool
+
+def start_pdf_downloads(urls, executor):
+    """
+    在 executor 中開始下載所有 URL（重複者只下載一次），供 merge_multiple_pdfs 的 downloads 參數使用
+
+    Returns:
+        dict: URL 對應下載暫存檔的 Future
+    """
+    return {url: executor.submit(_download_pdf, url) for url in dict.fromkeys(urls)}
+
+def merge_multiple_pdfs(pdf_files_list, readers=None, output=None, downloads=None, errors=None):
     """
     合併多個 PDF 檔案
-    
+
+    URL 在開始合併前就以最多 PDF_DOWNLOAD_WORKERS 個執行緒同時下載，合併時依原順序等待各檔案下載完成。
+    每個來源先對應到磁碟上的檔案（見 _open_merge_source），再由 qpdf（pikepdf.Job，等同
+    `qpdf --empty --pages ... -- out.pdf`）逐頁從來源檔案讀取並寫入輸出檔，
+    頁面內容不會全部載入記憶體，峰值記憶體不隨合併的總頁數增加。
+
     Args:
-        pdf_files_list: 一個列表，每個元素是一個元組 (pdf_bytes, is_from_url)
-                      - pdf_bytes: 如果 is_from_url 為 True，則是 URL 字串；否則是 PDF 的 bytes
-                      - is_from_url: 布林值，表示 pdf_bytes 是 URL 還是 bytes
-    
+        pdf_files_list: 一個列表，每個元素是一個元組 (pdf_content, is_from_url) 或 (pdf_content, is_from_url, page_range)
+                      - pdf_content: 如果 is_from_url 為 True，則是 URL 或本地檔案路徑；否則是 PDF 的 bytes 或可讀取的檔案物件
+                      - is_from_url: 布林值，表示 pdf_content 是 URL（路徑）還是內容
+                      - page_range: 可選的 (start, end) 頁碼範圍（從 0 開始，不含 end，end 為 None 表示到最後一頁）
+                        同一份 PDF 的多個範圍只會準備一次
+        readers: 可選的已準備來源字典，多次合併共用時同一份 PDF 只準備一次（其中的來源由呼叫端負責關閉）
+        output: 可選的可寫入檔案物件，未指定時寫入新的暫存檔
+        downloads: 可選的 start_pdf_downloads 結果，多次合併共用時由呼叫端提前開始下載
+        errors: 可選的字典，記錄無法下載或讀取的來源與錯誤訊息
+
     Returns:
-        bytes: 合併後的 PDF 檔案的 bytes
-    """
-    import io
-    import requests
-    from PyPDF2 import PdfReader, PdfWriter
-    
-    # 創建一個 PDF writer 對象
-    merger = PdfWriter()
-    
+        file: 已移到開頭的合併後 PDF 檔案物件（即 output 或暫存檔），沒有任何頁面時返回 None
+    """
+    import pikepdf
+
+    # 已準備的來源，同一份內容只準備一次
+    release = readers is None
+    if readers is None:
+        readers = {}
+    if errors is None:
+        errors = {}
+
+    # 預先開始下載尚未提供的 URL
+    urls = [
+        entry[0] for entry in pdf_files_list
+        if entry[1] and entry[0].startswith('http') and entry[0] not in readers and entry[0] not in (downloads or {})
+    ]
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(PDF_DOWNLOAD_WORKERS, len(urls)))) as executor:
+            downloads = {**(downloads or {}), **start_pdf_downloads(urls, executor)}
+            pages = _collect_pages(pdf_files_list, readers, downloads, errors)
+
+        # 如果沒有成功添加任何頁面
+        if not pages:
+            return None
+
+        # qpdf 依序從來源檔案讀取頁面並直接寫入輸出檔
+        merged = tempfile.NamedTemporaryFile(suffix=".pdf")
+        try:
+            pikepdf.Job(["qpdf", "--empty", "--warning-exit-0", "--pages", *pages, "--", merged.name]).run()
+            if output is None:
+                output = merged
+            else:
+                shutil.copyfileobj(merged, output)
+                merged.close()
+        except Exception:
+            merged.close()
+            raise
+        output.seek(0)
+        return output
+    finally:
+        if release:
+            for source in readers.values():
+                source.close()
+            readers.clear()
+
+def _collect_pages(pdf_files_list, readers, downloads, errors):
+    """
+    依原順序準備各來源（URL 等待其下載完成），返回 qpdf --pages 的參數（來源檔案路徑與頁碼範圍）
+    """
+    def reader_key(entry):
+        return entry[0] if entry[1] else id(entry[0])
+
+    pages = []
     # 遍歷所有 PDF 檔案
-    for pdf_content, is_from_url in pdf_files_list:
+    for entry in pdf_files_list:
+        pdf_content, is_from_url = entry[:2]
+        page_range = entry[2] if len(entry) > 2 else None
+        key = reader_key(entry)
         try:
             # 根據內容類型處理 PDF
-            if is_from_url:
-                # 如果是 URL，下載 PDF 檔案
-                if pdf_content.startswith('http'):
-                    response = requests.get(pdf_content)
-                    if response.status_code == 200:
-                        pdf = PdfReader(io.BytesIO(response.content))
-                    else:
-                        print(f"下載 PDF 失敗，跳過此檔案。狀態碼: {response.status_code}")
-                        continue
-                else:
-                    # 本地檔案路徑
-                    try:
-                        pdf = PdfReader(pdf_content)
-                    except:
-                        print(f"讀取本地 PDF 失敗，跳過此檔案: {pdf_content}")
-                        continue
+            if key in readers:
+                source = readers[key]
+            elif is_from_url and pdf_content.startswith('http'):
+                # 如果是 URL，使用下載的暫存檔
+                try:
+                    source = _open_merge_source(downloads[pdf_content].result())
+                except Exception as e:
+                    print(f"下載 PDF 失敗，跳過此檔案: {pdf_content} ({e})")
+                    errors[pdf_content] = str(e)
+                    continue
+            elif is_from_url:
+                # 本地檔案路徑
+                try:
+                    source = _open_merge_source(pdf_content)
+                except Exception as e:
+                    print(f"讀取本地 PDF 失敗，跳過此檔案: {pdf_content}")
+                    errors[pdf_content] = str(e)
+                    continue
             else:
-                # 如果是 bytes 內容
-                pdf = PdfReader(io.BytesIO(pdf_content))
-            
-            # 添加所有頁面
-            for page in pdf.pages:
-                merger.add_page(page)
-                
+                # bytes 內容或檔案物件
+                source = _open_merge_source(pdf_content)
+
+            readers[key] = source
+
+            # 添加所有頁面（或指定範圍的頁面）
+            start, end = page_range if page_range is not None else (0, None)
+            end = source.page_count if end is None else min(end, source.page_count)
+            if start < end:
+                pages += [source.path, f"{start + 1}-{end}"]
+
         except Exception as e:
             print(f"處理 PDF 時發生錯誤: {e}")
+            if is_from_url:
+                errors[pdf_content] = str(e)
             continue
-    
-    # 如果沒有成功添加任何頁面
-    if len(merger.pages) == 0:
+    return pages
+
+class _MergeSource:
+    """
+    合併來源在磁碟上的檔案與頁數
+
+    path 為合併建立的連結或複本時（owned），close 時刪除
+    """
+    def __init__(self, path, page_count, owned=False):
+        self.path = path
+        self.page_count = page_count
+        self._owned = owned
+
+    def close(self):
+        if self._owned:
+            self._owned = False
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+def _open_merge_source(pdf_content):
+    """
+    將合併來源對應到磁碟上的檔案並讀取頁數（無法解析時拋出例外）
+
+    本地路徑直接使用；有檔名的已開啟檔案（下載暫存檔、快取片段）建立硬連結，
+    原檔案之後被刪除（例如快取淘汰）時仍可讀取；其他內容（bytes、記憶體中的檔案物件，
+    或無法建立連結時）以區塊複製到暫存檔。
+    """
+    import pikepdf
+
+    if isinstance(pdf_content, str):
+        path, owned = pdf_content, False
+    else:
+        path, owned = _link_open_file(pdf_content) or _spool_to_file(pdf_content), True
+
+    try:
+        with pikepdf.open(path) as pdf:
+            page_count = len(pdf.pages)
+    except Exception:
+        if owned:
+            os.unlink(path)
+        raise
+    return _MergeSource(path, page_count, owned)
+
+def _link_open_file(f):
+    """為已開啟檔案建立暫存目錄中的硬連結並返回路徑，檔案沒有對應路徑或無法連結時返回 None"""
+    name = getattr(f, "name", None)
+    if not isinstance(name, str):
         return None
-    
-    # 將合併後的 PDF 寫入 BytesIO 對象
-    output = io.BytesIO()
-    merger.write(output)
-    
-    # 返回合併後的 PDF 的 bytes
-    return output.getvalue()
+    link = os.path.join(tempfile.gettempdir(), f"merge-{os.urandom(16).hex()}.pdf")
+    try:
+        os.link(name, link)
+    except OSError:
+        return None
+    # 確認連結的是同一個檔案（路徑可能已被刪除並換成另一個檔案）
+    try:
+        if os.path.samestat(os.stat(link), os.fstat(f.fileno())):
+            return link
+    except (OSError, ValueError, io.UnsupportedOperation):
+        pass
+    os.unlink(link)
+    return None
+
+def _spool_to_file(pdf_content):
+    """將 bytes 或檔案物件的內容以區塊寫入暫存檔，返回路徑"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            if isinstance(pdf_content, (bytes, bytearray)):
+                spool.write(pdf_content)
+            else:
+                pdf_content.seek(0)
+                shutil.copyfileobj(pdf_content, spool, PDF_CHUNK_SIZE)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
@@ -12,10 +12,9 @@ from api import (
     upload_inspection_pdf
 )
 from convert import get_projects_df, get_inspections_df
+from report_jobs import get_report_job_manager
+import api_async
 
-from api import API_BASE_URL
-
-@st.cache_data()
 def get_merged_df(project_filter):
 
         # 取得抽查資料
@@ -75,7 +74,6 @@ def add_inspection_ui():
                 resp = create_inspection(data)
                 if "error" not in resp:
                     st.toast("新增抽查成功", icon="✅")
-                    st.cache_data.clear()
                     time.sleep(1)
                     st.rerun()
                 else:
@@ -155,7 +153,6 @@ def update_inspection_ui():
                     else:
                         st.error(f"PDF 上傳失敗: {pdf_response['error']}")
                 
-                st.cache_data.clear()
                 time.sleep(1)
                 st.rerun()
             else:
@@ -198,7 +195,6 @@ def delete_inspection_ui():
         response = delete_inspection(inspection_id)
         if "error" not in response:
             st.toast("抽查刪除成功", icon="✅")
-            st.cache_data.clear()
             time.sleep(1)
             st.rerun()
         else:
@@ -265,71 +261,94 @@ if selection:
 
     if st.button("🗑️ 刪除報表", key="delete_multiple"):
 
-        for _, row in filtered_df.iterrows():
-            inspection_id = int(row['抽查編號'])
+        # 並行刪除所有選取的抽查
+        inspection_ids = [int(row['抽查編號']) for _, row in filtered_df.iterrows()]
+        results = api_async.gather([api_async.delete_inspection(inspection_id) for inspection_id in inspection_ids])
 
-            delete_inspection(inspection_id)
-            st.toast("刪除成功", icon="✅")
+        for inspection_id, response in zip(inspection_ids, results):
+            if "error" not in response:
+                st.toast("刪除成功", icon="✅")
+            else:
+                st.error(f"刪除失敗 (ID: {inspection_id}): {response['error']}")
 
-        st.cache_data.clear()
         time.sleep(1)
         st.rerun()
 
 st.markdown("---")
 
+# 報表生成中：每秒更新進度，完成後重新執行頁面以顯示下載按鈕
+@st.fragment(run_every=1)
+def report_job_progress(job_id):
+    job = get_report_job_manager().get(job_id)
+    if job is None or job.status not in ("queued", "running"):
+        st.rerun()
+
+    text = f"報表生成中... 抽查 {job.inspections_done}/{job.inspections_total}"
+    if job.pages_total:
+        text += f"，照片頁 {job.pages_done}/{job.pages_total}"
+    st.progress(job.fraction, text=text)
+
+# 顯示報表工作狀態，完成後提供下載（重新整理或重新連線後仍可下載）
+def report_job_status(job_id):
+    job = get_report_job_manager().get(job_id)
+    if job is None:
+        return
+
+    if job.status in ("queued", "running"):
+        report_job_progress(job_id)
+    elif job.status == "done":
+        for warning in job.warnings:
+            st.warning(warning)
+        try:
+            with open(job.path, "rb") as f:
+                st.download_button(
+                    label="下載合併 PDF 報告",
+                    data=f,
+                    file_name=f"multiple_inspection_reports_{datetime.fromtimestamp(job.created_at).strftime('%Y%m%d%H%M%S')}.pdf",
+                    mime="application/pdf"
+                )
+        except FileNotFoundError:
+            # 報表超過保留時間已被清除
+            st.error("報表檔案已不存在，請重新列印報表。")
+    else:
+        st.error(f"合併 PDF 失敗: {job.error}")
+
 if len(selection) > 0:
+    from utils import REPORT_PROFILES, DEFAULT_REPORT_PROFILE, REPORT_BACKENDS, DEFAULT_REPORT_BACKEND, REPORT_SERVER_BACKEND
+
+    report_profile = st.selectbox(
+        "報表大小",
+        options=list(REPORT_PROFILES),
+        index=list(REPORT_PROFILES).index(DEFAULT_REPORT_PROFILE),
+        format_func=lambda x: REPORT_PROFILES[x]["label"]
+    )
+
+    # 後端生成會改寫抽查的 PDF，只在啟用後提供選擇
+    report_backend = DEFAULT_REPORT_BACKEND
+    if REPORT_SERVER_BACKEND:
+        report_backend = st.selectbox(
+            "生成方式",
+            options=list(REPORT_BACKENDS),
+            index=list(REPORT_BACKENDS).index(DEFAULT_REPORT_BACKEND),
+            format_func=lambda x: REPORT_BACKENDS[x],
+            help="伺服器生成時由後端排版照片，報表大小設定不適用"
+        )
+        if report_backend == "server":
+            st.warning("⚠️ 伺服器生成會將每筆選取抽查的 PDF 替換為生成的報告（可能取代已上傳的原始抽查表），且報告不包含原始抽查表頁面。")
+
     if st.button("📝列印報表", key="print_multiple"):
-        from utils import generate_pdf, merge_multiple_pdfs
         
         # 取得所有選中的抽查報表數據
         filtered_df = df.iloc[selection]
 
-        pdf_files_list = []
-        
-        # 遍歷所有選中的抽查
-        for i, (_, row) in enumerate(filtered_df.iterrows()):
+        # 送出背景報表工作（相同的選擇正在生成時不重複送出）
+        # 工作編號同時存於網址，重新整理或重新連線後仍可取得報表
+        st.session_state.report_job_id = st.query_params["report_job"] = get_report_job_manager().submit(
+            filtered_df['抽查編號'].tolist(),
+            report_profile,
+            report_backend
+        )
 
-            # 獲取完整的抽查數據
-            insp_id = int(row['抽查編號'])
-            insp_data = get_inspection(insp_id)
-            # st.write(insp_data)
-            
-            if insp_data:
-                # # 添加原始 PDF（如果有）
-                # if insp_data.get('pdf_path'):
-                #     pdf_url = f"http://localhost:8000/{insp_data.get('pdf_path')}"
-                #     pdf_files_list.append((pdf_url, True))
-                
-                # # 生成並添加照片報告 PDF
-                # photo_pdf_bytes = generate_pdf(insp_data)
-                # pdf_files_list.append((photo_pdf_bytes, False))
-                # 添加原始 PDF（如果有）
-                if insp_data.get('pdf_path'):
-                    pdf_url = f"{API_BASE_URL}/{insp_data.get('pdf_path')}"
-                    pdf_files_list.append((pdf_url, True))
-
-                # 照片分組，每3張為一組
-                photos = insp_data.get('photos', [])
-                for j in range(0, len(photos), 3):
-                    photo_group = photos[j:j+3]
-                    
-                    # 為這組照片建立新的 inspection data (僅包含這組照片)
-                    temp_insp_data = insp_data.copy()
-                    temp_insp_data["photos"] = photo_group
-
-                    # 生成報告 PDF 並加入清單
-                    photo_pdf_bytes = generate_pdf(temp_insp_data)
-                    pdf_files_list.append((photo_pdf_bytes, False))
-        # 合併所有 PDF
-        merged_pdf_bytes = merge_multiple_pdfs(pdf_files_list)
-        
-        if merged_pdf_bytes:
-            # 在 Streamlit 中顯示下載按鈕
-            st.download_button(
-                label="下載合併 PDF 報告",
-                data=merged_pdf_bytes,
-                file_name=f"multiple_inspection_reports_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf",
-                mime="application/pdf"
-            )
-        else:
-            st.error("合併 PDF 失敗，請確認選擇的報表有效。")
+report_job_id = st.session_state.get("report_job_id") or st.query_params.get("report_job")
+if report_job_id:
+    report_job_status(report_job_id)
@@ -1,49 +1,54 @@
 import streamlit as st
-import pypdfium2 as pdfium
 import datetime
 
-from api import get_projects, create_inspection, upload_inspection_pdf, upload_photo, get_project_storage
+from api import get_projects, create_inspection, upload_inspection_pdf, upload_photos, get_project_storage
+from pdf_preview import open_uploaded_pdf
+from staging import StagingQuotaError, get_staging_store
 
 if "photos" not in st.session_state:
-    st.session_state.photos = []  # 用來儲存多張照片的列表
+    st.session_state.photos = []  # 用來儲存多張照片的列表（檔案暫存於磁碟，只保存 StagedFile）
 if "pdf_file" not in st.session_state:
-    st.session_state.pdf_file = None  # 用來儲存上傳的 PDF 檔案
+    st.session_state.pdf_file = None  # 用來儲存上傳的 PDF 檔案（StagedFile）
 if "project_id" not in st.session_state:
     st.session_state.project_id = None  # 用來儲存專案ID
+if "pending_inspection_id" not in st.session_state:
+    st.session_state.pending_inspection_id = None  # 已建立但仍有 PDF 或照片上傳失敗的抽查ID
+if "pdf_error" not in st.session_state:
+    st.session_state.pdf_error = None  # PDF 上傳失敗的錯誤訊息
 
 # PDF 初始化（不儲存檔案）
 def initialize_pdf(uploaded_file):
-    """直接使用上傳的檔案初始化 PDF 並返回頁數與圖像"""
+    """開啟上傳檔案的 PDF 預覽（同一個檔案只開啟一次，頁面在顯示時才渲染）"""
     try:
-        pdf = pdfium.PdfDocument(uploaded_file)
-        total_pages = len(pdf)
-        pdf_images = {i: pdf[i].render(scale=2).to_pil() for i in range(total_pages)}
-        return total_pages, pdf_images
+        return open_uploaded_pdf(uploaded_file)
     except Exception as e:
         st.error(f"❌ PDF 初始化錯誤: {e}")
-        return None, None
+        return None
 
 # 顯示 PDF 頁面
-def display_pdf_page(total_pages, pdf_images):
-    """顯示目前頁面"""
+def display_pdf_page(preview):
+    """顯示目前頁面（只渲染目前頁，相鄰頁在背景預先渲染）"""
     if "current_page" not in st.session_state:
         st.session_state.current_page = 0
 
-    current_page = st.session_state.current_page
+    total_pages = preview.page_count
+    current_page = min(st.session_state.current_page, total_pages - 1)
     if 0 <= current_page < total_pages:
-        image_to_show = pdf_images[current_page]
-        st.image(image_to_show, caption=f"📄 頁數 {current_page + 1} / {total_pages}")
+        image_to_show = preview.page_image(current_page)
+        st.image(image_to_show, caption=f"📄 頁數 {current_page + 1} / {total_pages}", output_format="PNG")
+
+# 翻頁（在重新執行前更新頁碼，按下後立即顯示新頁面）
+def change_pdf_page(step, total_pages):
+    st.session_state.current_page = max(0, min(st.session_state.get("current_page", 0) + step, total_pages - 1))
 
 # 分頁控制
 def pagination_controls(total_pages):
     """建立翻頁按鈕"""
     col0, col1, col2, col3 = st.columns([1, 1, 1, 1])
     with col1:
-        if st.button("⬆️ 上一頁") and st.session_state.current_page > 0:
-            st.session_state.current_page -= 1
+        st.button("⬆️ 上一頁", on_click=change_pdf_page, args=(-1, total_pages))
     with col2:
-        if st.button("⬇️ 下一頁") and st.session_state.current_page < total_pages - 1:
-            st.session_state.current_page += 1
+        st.button("⬇️ 下一頁", on_click=change_pdf_page, args=(1, total_pages))
 
 @st.dialog("📤 上傳抽查表")
 def upload_pdf_ui():
@@ -53,7 +58,17 @@ def upload_pdf_ui():
     #確認目前系統餘裕
 
     if st.button("確認上傳"):
-        st.session_state.pdf_file = pdf_file
+        store = get_staging_store()
+        staged_file = None
+        if pdf_file is not None:
+            try:
+                staged_file = store.add(pdf_file)
+            except StagingQuotaError as e:
+                st.error(f"❌ {e}")
+                return
+        if st.session_state.pdf_file:
+            store.discard(st.session_state.pdf_file)
+        st.session_state.pdf_file = staged_file
         st.rerun()
 
 @st.dialog("📤 上傳照片")
@@ -70,14 +85,87 @@ def upload_photos_ui():
         # Append the uploaded file to the session state
 
         if st.button("確認上傳"):
+            try:
+                staged_file = get_staging_store().add(uploaded_file)
+            except StagingQuotaError as e:
+                st.error(f"❌ {e}")
+                return
             st.session_state.photos.append({
-                "file": uploaded_file,
+                "file": staged_file,
                 # "date": capture_date,
                 "caption": caption
             })
             st.success("照片上傳成功！")
             st.rerun()
 
+# 刪除暫存的照片
+def remove_photo(index):
+    photo = st.session_state.photos.pop(index)
+    get_staging_store().discard(photo["file"])
+
+# 上傳暫存的照片
+def upload_staged_photos(inspection_id):
+    """
+    以有限並行數上傳暫存的照片並顯示整體進度，成功的照片從暫存中移除
+
+    Returns:
+        list: 上傳失敗的照片（保留於 st.session_state.photos 以便重試）
+    """
+    photos = st.session_state.photos
+    if not photos:
+        return []
+
+    # 取得目前日期作為照片日期
+    today = datetime.date.today().isoformat()
+
+    progress_bar = st.progress(0.0, text=f"上傳照片中... 0/{len(photos)}")
+
+    def on_progress(done, total):
+        progress_bar.progress(done / total, text=f"上傳照片中... {done}/{total}")
+
+    results = upload_photos(inspection_id, photos, today, progress=on_progress)
+    progress_bar.empty()
+
+    store = get_staging_store()
+    failed = []
+    for photo, result in zip(photos, results):
+        if "error" in result:
+            failed.append({"file": photo["file"], "caption": photo["caption"], "error": result["error"]})
+        else:
+            store.discard(photo["file"])
+
+    st.session_state.photos = failed
+    return failed
+
+# 上傳暫存的 PDF
+def upload_staged_pdf(inspection_id):
+    """
+    上傳暫存的 PDF，成功後從暫存中移除；失敗時保留以便重試（分段上傳時會從未完成的分段繼續）
+
+    Returns:
+        bool: 沒有 PDF 或上傳成功時為 True
+    """
+    if not st.session_state.pdf_file:
+        return True
+
+    result = upload_inspection_pdf(inspection_id, st.session_state.pdf_file)
+    if "error" in result:
+        st.session_state.pdf_error = result["error"]
+        return False
+
+    get_staging_store().discard(st.session_state.pdf_file)
+    st.session_state.pdf_file = None
+    st.session_state.pdf_error = None
+    return True
+
+# 清空表單和session state，並刪除暫存檔案
+def reset_staged_data():
+    st.session_state.photos = []
+    st.session_state.pdf_file = None
+    st.session_state.pdf_error = None
+    st.session_state.pending_inspection_id = None
+    get_staging_store().clear()
+
 # 儲存資料函數
 def save_inspection_data():
     """儲存抽查資料、PDF和照片"""
@@ -118,34 +206,16 @@ def save_inspection_data():
     inspection_id = result["id"]
     st.success(f"✅ 抽查資料儲存成功！ID: {inspection_id}")
     
-    # 上傳PDF檔案（如果有）
-    if st.session_state.pdf_file:
-        pdf_result = upload_inspection_pdf(inspection_id, st.session_state.pdf_file)
-        if "error" in pdf_result:
-            st.error(f"❌ PDF上傳失敗: {pdf_result['error']}")
-        else:
-            st.success("✅ PDF上傳成功！")
-    
-    # 上傳照片（如果有）
-    for photo in st.session_state.photos:
-        # 取得目前日期作為照片日期
-        today = datetime.date.today().isoformat()
-        
-        photo_result = upload_photo(
-            inspection_id=inspection_id,
-            file=photo["file"],
-            capture_date=today,
-            caption=photo["caption"]
-        )
-        
-        if "error" in photo_result:
-            st.error(f"❌ 照片上傳失敗: {photo_result['error']}")
-        else:
-            st.success(f"✅ 照片「{photo['caption']}」上傳成功！")
-    
-    # 清空表單和session state
-    st.session_state.photos = []
-    st.session_state.pdf_file = None
+    # 上傳PDF檔案與照片（如果有），失敗的檔案保留，之後可重試而不需重新建立抽查
+    pdf_uploaded = upload_staged_pdf(inspection_id)
+    photo_count = len(st.session_state.photos)
+    failed = upload_staged_photos(inspection_id)
+    if failed or not pdf_uploaded:
+        st.session_state.pending_inspection_id = inspection_id
+    else:
+        if photo_count:
+            st.toast(f"✅ {photo_count} 張照片上傳成功！")
+        reset_staged_data()
     st.rerun()
 
 try:
@@ -204,18 +274,18 @@ with col4:
         # with st.expander("📑 PDF 預覽", expanded=True):
         pdf_file = st.session_state.get("pdf_file", None)
         if pdf_file:
-            total_pages, pdf_images = initialize_pdf(pdf_file)
-            if total_pages and pdf_images:
-                display_pdf_page(total_pages, pdf_images)
-                pagination_controls(total_pages)
+            preview = initialize_pdf(pdf_file)
+            if preview and preview.page_count:
+                display_pdf_page(preview)
+                pagination_controls(preview.page_count)
         else:
             st.info("尚未上傳 PDF。")
 
     # === 每張照片一個 Tab ===
     for i, photo in enumerate(st.session_state.photos):
         with tabs[i + 1]:  # tabs[1] 是第一張照片
-            st.image(photo["file"], caption="圖片說明: "+photo["caption"])
-            st.button("刪除照片", key=f"delete_photo_{i}", on_click=lambda i=i: st.session_state.photos.pop(i) if len(st.session_state.photos) > 1 else st.session_state.photos.clear())  # 刪除照片按鈕
+            st.image(photo["file"].path, caption="圖片說明: "+photo["caption"])
+            st.button("刪除照片", key=f"delete_photo_{i}", on_click=remove_photo, args=(i,))  # 刪除照片按鈕
 
 # PDF 預覽區
 
@@ -255,5 +325,26 @@ if current_storage['total_size_bytes'] <= max_size:
 
     st.markdown("---")
 
-    if st.button("儲存資料", type="primary"):
+    if st.session_state.pending_inspection_id:
+        # 抽查已建立，但有 PDF 或照片上傳失敗：只重新上傳失敗的檔案
+        failed = st.session_state.photos
+        st.warning(f"抽查資料已儲存（ID: {st.session_state.pending_inspection_id}），但以下檔案上傳失敗：")
+        if st.session_state.pdf_file:
+            st.markdown(f"- PDF {st.session_state.pdf_file.name}：{st.session_state.pdf_error or ''}")
+        for photo in failed:
+            st.markdown(f"- {photo['file'].name}（{photo['caption']}）：{photo.get('error', '')}")
+
+        col_retry, col_discard = st.columns([1, 1])
+        if col_retry.button("🔁 重新上傳失敗的檔案", type="primary"):
+            photo_count = len(failed)
+            pdf_uploaded = upload_staged_pdf(st.session_state.pending_inspection_id)
+            if not upload_staged_photos(st.session_state.pending_inspection_id) and pdf_uploaded:
+                st.toast(f"✅ {photo_count} 張照片上傳成功！" if photo_count else "✅ PDF上傳成功！")
+                reset_staged_data()
+            st.rerun()
+        if col_discard.button("放棄失敗的檔案"):
+            reset_staged_data()
+            st.rerun()
+
+    elif st.button("儲存資料", type="primary"):
         save_inspection_data()
\ No newline at end of file
@@ -1,16 +1,17 @@
 import streamlit as st
-import pypdfium2 as pdfium
 import datetime
 import os
 import requests
 from io import BytesIO
 
 from api import get_projects, get_inspections, get_inspection, update_inspection, upload_inspection_pdf, upload_photo
+from pdf_preview import open_uploaded_pdf, open_pdf_path
+from staging import get_staging_store
 
 if "photos" not in st.session_state:
-    st.session_state.photos = []  # 用來儲存多張照片的列表
+    st.session_state.photos = []  # 用來儲存多張照片的列表（檔案暫存於磁碟，只保存 StagedFile）
 if "pdf_file" not in st.session_state:
-    st.session_state.pdf_file = None  # 用來儲存上傳的 PDF 檔案
+    st.session_state.pdf_file = None  # 用來儲存上傳的 PDF 檔案（StagedFile）
 if "selected_inspection_id" not in st.session_state:
     st.session_state.selected_inspection_id = None  # 儲存選中的抽查表ID
 if "inspection_data" not in st.session_state:
@@ -19,46 +20,57 @@ if "inspection_data" not in st.session_state:
 # API 基礎 URL，預設為 localhost:8000
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
-# 從URL獲取PDF並初始化
-def initialize_pdf_from_url(pdf_url):
-    """從URL獲取PDF檔案並初始化"""
+# PDF 初始化（不儲存檔案）
+def initialize_pdf(uploaded_file):
+    """開啟上傳檔案的 PDF 預覽（同一個檔案只開啟一次，頁面在顯示時才渲染）"""
     try:
-        response = requests.get(pdf_url)
-        if response.status_code == 200:
-            pdf_bytes = BytesIO(response.content)
-            pdf = pdfium.PdfDocument(pdf_bytes)
-            total_pages = len(pdf)
-            pdf_images = {i: pdf[i].render(scale=2).to_pil() for i in range(total_pages)}
-            return total_pages, pdf_images
-        else:
-            st.error(f"❌ 無法獲取PDF: HTTP {response.status_code}")
-            return None, None
+        return open_uploaded_pdf(uploaded_file)
     except Exception as e:
         st.error(f"❌ PDF 初始化錯誤: {e}")
-        return None, None
+        return None
+
+# 從後端獲取PDF並初始化
+def initialize_pdf_from_path(pdf_path):
+    """下載後端的 PDF 檔案並開啟預覽（同一路徑只下載並開啟一次）"""
+    try:
+        return open_pdf_path(pdf_path)
+    except requests.HTTPError as e:
+        st.error(f"❌ 無法獲取PDF: HTTP {e.response.status_code}")
+        return None
+    except Exception as e:
+        st.error(f"❌ PDF 初始化錯誤: {e}")
+        return None
 
 # 顯示 PDF 頁面
-def display_pdf_page(total_pages, pdf_images):
-    """顯示目前頁面"""
+def display_pdf_page(preview):
+    """顯示目前頁面（只渲染目前頁，相鄰頁在背景預先渲染）"""
     if "current_page" not in st.session_state:
         st.session_state.current_page = 0
 
-    current_page = st.session_state.current_page
+    total_pages = preview.page_count
+    current_page = min(st.session_state.current_page, total_pages - 1)
     if 0 <= current_page < total_pages:
-        image_to_show = pdf_images[current_page]
-        st.image(image_to_show, caption=f"📄 頁數 {current_page + 1} / {total_pages}")
+        image_to_show = preview.page_image(current_page)
+        st.image(image_to_show, caption=f"📄 頁數 {current_page + 1} / {total_pages}", output_format="PNG")
+
+# 翻頁（在重新執行前更新頁碼，按下後立即顯示新頁面）
+def change_pdf_page(step, total_pages):
+    st.session_state.current_page = max(0, min(st.session_state.get("current_page", 0) + step, total_pages - 1))
 
 # 分頁控制
 def pagination_controls(total_pages):
     """建立翻頁按鈕"""
     col0, col1, col2, col3 = st.columns([1, 1, 1, 1])
     with col1:
-        if st.button("⬆️ 上一頁") and st.session_state.current_page > 0:
-            st.session_state.current_page -= 1
+        st.button("⬆️ 上一頁", on_click=change_pdf_page, args=(-1, total_pages))
     with col2:
-        if st.button("⬇️ 下一頁") and st.session_state.current_page < total_pages - 1:
-            st.session_state.current_page += 1
+        st.button("⬇️ 下一頁", on_click=change_pdf_page, args=(1, total_pages))
+
 
+# 刪除暫存的照片
+def remove_photo(index):
+    photo = st.session_state.photos.pop(index)
+    get_staging_store().discard(photo["file"])
 
 # 更新抽查資料函數
 def update_inspection_data():
@@ -86,9 +98,10 @@ def update_inspection_data():
     updated_inspection = get_inspection(st.session_state.selected_inspection_id)
     if updated_inspection:
         st.session_state.inspection_data = updated_inspection
-        # 清空照片列表和PDF檔案（因為已經上傳了）
+        # 清空照片列表和PDF檔案（因為已經上傳了），並刪除暫存檔案
         st.session_state.photos = []
         st.session_state.pdf_file = None
+        get_staging_store().clear()
         st.rerun()
 
 # 選擇抽查表函數
@@ -159,6 +172,7 @@ with st.sidebar:
                 # 清空之前的資料
                 st.session_state.photos = []
                 st.session_state.pdf_file = None
+                get_staging_store().clear()
                 
                 # 獲取最新資料
                 select_inspection(selected_id)
@@ -226,10 +240,10 @@ if st.session_state.selected_inspection_id and st.session_state.inspection_data:
         with tabs[0]:
             pdf_file = st.session_state.get("pdf_file", None)
             if pdf_file:
-                total_pages, pdf_images = initialize_pdf(pdf_file)
-                if total_pages and pdf_images:
-                    display_pdf_page(total_pages, pdf_images)
-                    pagination_controls(total_pages)
+                preview = initialize_pdf(pdf_file)
+                if preview and preview.page_count:
+                    display_pdf_page(preview)
+                    pagination_controls(preview.page_count)
             elif inspection_data.get("pdf_path"):
                 # 構建PDF的完整URL
                 pdf_filename = os.path.basename(inspection_data['pdf_path'])
@@ -238,10 +252,10 @@ if st.session_state.selected_inspection_id and st.session_state.inspection_data:
                 
                 # 嘗試顯示PDF
                 try:
-                    total_pages, pdf_images = initialize_pdf_from_url(pdf_url)
-                    if total_pages and pdf_images:
-                        display_pdf_page(total_pages, pdf_images)
-                        pagination_controls(total_pages)
+                    preview = initialize_pdf_from_path(inspection_data['pdf_path'])
+                    if preview and preview.page_count:
+                        display_pdf_page(preview)
+                        pagination_controls(preview.page_count)
                     else:
                         st.info("無法顯示PDF預覽，但您可以點擊上方連結查看。")
                 except Exception as e:
@@ -278,8 +292,8 @@ if st.session_state.selected_inspection_id and st.session_state.inspection_data:
         # === 新上傳照片 Tabs ===
         for i, photo in enumerate(st.session_state.photos):
             with tabs[i + 1 + len(photos)]:  # 從已有照片後開始
-                st.image(photo["file"], caption=f"圖片說明: {photo['caption']}")
-                st.button("刪除照片", key=f"delete_photo_{i}", on_click=lambda i=i: st.session_state.photos.pop(i) if len(st.session_state.photos) > 1 else st.session_state.photos.clear())
+                st.image(photo["file"].path, caption=f"圖片說明: {photo['caption']}")
+                st.button("刪除照片", key=f"delete_photo_{i}", on_click=remove_photo, args=(i,))
 
 else:
     st.info("👈 請從側邊欄選擇要編輯的抽查表")
\ No newline at end of file
@@ -1,7 +1,7 @@
 import streamlit as st
-import pandas as pd
 import time
 import os
+import math
 from io import BytesIO
 import requests
 from api import (
@@ -11,33 +11,26 @@ from api import (
     update_photo,
     delete_photo
 )
-from convert import get_inspections_df, get_photos_df
+from convert import get_inspections_df, get_project_photos_df as load_project_photos_df
+from thumbnails import get_thumbnail, fetch_photo, prefetch_thumbnails
 
 # inspections_df = get_inspections_df(st.session_state.active_project_id)
 
 # API 基礎 URL，預設為 localhost:8000
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
+# 圖廊每頁顯示的照片數
+GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE", "12"))
+
 def get_project_photos_df():
 
-    inspections_df = get_inspections_df(st.session_state.active_project_id)
-    # 取得照片資料
-    df = get_photos_df()
+    # 取得目前專案的照片資料（已附加抽查資訊）
+    df = load_project_photos_df(st.session_state.active_project_id)
     
     if df.empty:
         st.info("目前沒有照片資料")
         st.stop()
         return
-    
-    # 合併抽查資訊
-    if not inspections_df.empty:
-        df = pd.merge(
-            df, 
-            inspections_df[["抽查編號", "檢查位置", "抽查表名稱", "抽查次數"]], 
-            left_on="抽查編號", 
-            right_on="抽查編號", 
-            how="right"
-        )
 
     return df
 
@@ -113,7 +106,7 @@ def get_filter_options():
 
     return selected_inspection_name, selected_count
 
-def single_card(row):
+def single_card(row, photo_errors=None):
     # 構建照片的完整URL
     if '檔案路徑' in row:
         photo_filename = os.path.basename(row['檔案路徑'])
@@ -124,18 +117,52 @@ def single_card(row):
         # st.markdown(f"**照片說明**: {row.get('描述', '無說明')}")
         st.markdown(f"**檢查位置**: {row.get('檢查位置', '無位置')}")
         
-        # 顯示照片
+        # 顯示縮圖，原圖只在需要時才下載
         try:
-            response = requests.get(photo_url)
-            if response.status_code == 200:
-                st.image(BytesIO(response.content), caption=row.get('描述', '無說明'))
-            else:
-                st.error(f"無法獲取照片: HTTP {response.status_code}")
-                st.markdown(f"**照片連結**: [{photo_filename}]({photo_url})")
+            # 預先下載已失敗的照片不再重試
+            if photo_errors and row['檔案路徑'] in photo_errors:
+                raise photo_errors[row['檔案路徑']]
+            st.image(BytesIO(get_thumbnail(row['檔案路徑'])), caption=row.get('描述', '無說明'))
+            if st.toggle("🔍 顯示原圖", key=f"full_photo_{row.get('照片編號')}"):
+                st.image(BytesIO(fetch_photo(row['檔案路徑'])))
+        except requests.HTTPError as e:
+            st.error(f"無法獲取照片: HTTP {e.response.status_code}")
+            st.markdown(f"**照片連結**: [{photo_filename}]({photo_url})")
         except Exception as e:
             st.error(f"照片顯示錯誤: {e}")
             st.markdown(f"**照片連結**: [{photo_filename}]({photo_url})")
 
+# 翻頁
+def change_gallery_page(step):
+    st.session_state.gallery_page += step
+
+# 分頁圖廊，翻頁與顯示原圖只重新執行此區塊
+@st.fragment
+def gallery(df):
+    total_pages = max(1, math.ceil(len(df) / GALLERY_PAGE_SIZE))
+    if not 0 <= st.session_state.gallery_page < total_pages:
+        st.session_state.gallery_page = 0
+
+    page = st.session_state.gallery_page
+    page_df = df.iloc[page * GALLERY_PAGE_SIZE:(page + 1) * GALLERY_PAGE_SIZE]
+
+    # 只並行下載目前頁面的照片縮圖，再依序顯示
+    with st.spinner("載入照片中..."):
+        photo_errors = prefetch_thumbnails(page_df["檔案路徑"].dropna().tolist())
+
+    cols = st.columns(3, border=True)
+    for i, (_, row) in enumerate(page_df.iterrows()):
+        with cols[i % 3]:
+            single_card(row, photo_errors)
+
+    # 分頁控制
+    col0, col1, col2, col3 = st.columns([1, 1, 1, 1])
+    with col1:
+        st.button("⬅️ 上一頁", disabled=page == 0, on_click=change_gallery_page, args=(-1,), use_container_width=True)
+    with col2:
+        st.button("➡️ 下一頁", disabled=page >= total_pages - 1, on_click=change_gallery_page, args=(1,), use_container_width=True)
+    st.caption(f"📄 第 {page + 1} / {total_pages} 頁，共 {len(df)} 張照片")
+
 # 上傳照片對話框
 @st.dialog("📤上傳照片")
 def upload_photo_ui():
@@ -166,7 +193,6 @@ def upload_photo_ui():
             response = upload_photo(inspection_id, photo_file,capture_date.strftime("%Y-%m-%d"), caption)
             if "error" not in response:
                 st.toast("照片上傳成功", icon="✅")
-                st.cache_data.clear()
                 time.sleep(1)
                 st.rerun()
             else:
@@ -213,13 +239,11 @@ def update_photo_ui():
         # 顯示照片預覽
         photo_url = f"{API_BASE_URL}/{photo['photo_path']}"
         try:
-            response = requests.get(photo_url)
-            if response.status_code == 200:
-                st.image(BytesIO(response.content), caption=photo.get('caption', '無說明'))
-            else:
-                st.error(f"無法獲取照片: HTTP {response.status_code}")
-                photo_filename = os.path.basename(photo['photo_path'])
-                st.markdown(f"**照片連結**: [{photo_filename}]({photo_url})")
+            st.image(BytesIO(get_thumbnail(photo['photo_path'])), caption=photo.get('caption', '無說明'))
+        except requests.HTTPError as e:
+            st.error(f"無法獲取照片: HTTP {e.response.status_code}")
+            photo_filename = os.path.basename(photo['photo_path'])
+            st.markdown(f"**照片連結**: [{photo_filename}]({photo_url})")
         except Exception as e:
             st.error(f"照片顯示錯誤: {e}")
             photo_filename = os.path.basename(photo['photo_path'])
@@ -236,7 +260,6 @@ def update_photo_ui():
             response = update_photo(photo_id, data)
             if "error" not in response:
                 st.toast("照片更新成功", icon="✅")
-                st.cache_data.clear()
                 time.sleep(1)
                 st.rerun()
             else:
@@ -279,7 +302,6 @@ def delete_photo_ui():
         response = delete_photo(photo_id)
         if "error" not in response:
             st.toast("照片刪除成功", icon="✅")
-            st.cache_data.clear()
             time.sleep(1)
             st.rerun()
         else:
@@ -293,27 +315,34 @@ st.sidebar.markdown("---")
 
 df=get_filter_df(selected_inspection_name, selected_count)
 
+# 篩選條件改變時回到第一頁
+if st.session_state.get("gallery_filter") != (selected_inspection_name, selected_count):
+    st.session_state.gallery_filter = (selected_inspection_name, selected_count)
+    st.session_state.gallery_page = 0
+
 if not df.empty:
     st.subheader(f"📸 照片圖廊")
     st.info(f"目前工程-> {st.session_state.active_project}")
-    cols = st.columns(3, border=True)
-    for i, (_, row) in enumerate(df.iterrows()):
-        with cols[i % 3]:
-            single_card(row)
+
+    gallery(df)
 
 st.markdown("---")
 
-# 按鈕列
-col1, col2, col3 = st.columns(3)
+# 按鈕列，開啟對話框時不重新載入圖廊
+@st.fragment
+def action_buttons():
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        if st.button("📤上傳照片", use_container_width=True):
+            upload_photo_ui()
 
-with col1:
-    if st.button("📤上傳照片", use_container_width=True):
-        upload_photo_ui()
+    with col2:
+        if st.button("✏️編輯照片", use_container_width=True):
+            update_photo_ui()
 
-with col2:
-    if st.button("✏️編輯照片", use_container_width=True):
-        update_photo_ui()
+    with col3:
+        if st.button("🗑️刪除照片", use_container_width=True):
+            delete_photo_ui()
 
-with col3:
-    if st.button("🗑️刪除照片", use_container_width=True):
-        delete_photo_ui()
\ No newline at end of file
+action_buttons()
\ No newline at end of file